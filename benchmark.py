@@ -0,0 +1,432 @@
+"""Замеры производительности V Rising Server Manager на синтетических данных сервера.
+
+Запускается без окна и без настоящего FTP:
+
+    python benchmark.py --output results.json
+    python benchmark.py --scale 0.1 --compare results.json
+
+FTP-сервер заменяется хранилищем в памяти (MemoryFTP), поэтому в замеры входит только работа
+самого приложения: разбор, заполнение моделей и виджетов, сериализация. Результаты пишутся в JSON,
+--compare сравнивает их с прошлым запуском и завершается с кодом 1 при замедлении больше порога.
+"""
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import time
+import json
+import random
+import tempfile
+import ftplib
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from itertools import accumulate
+
+import manager
+from PyQt5.QtWidgets import QApplication, QMessageBox
+from PyQt5.QtCore import QStandardPaths
+
+CHAT_WORDS = ('raid', 'castle', 'blood', 'sword', 'trade', 'sell', 'buy', 'help', 'dracula', 'base',
+              'clan', 'gloomrot', 'silverlight', 'anyone', 'now', 'please', 'where', 'boss', 'merchant', 'gg')
+CHANNELS = ('Global', 'Team', 'Local', 'Whisper')
+CATALOG_WORDS = ('Blood', 'Iron', 'Copper', 'Gem', 'Ruby', 'Sword', 'Axe', 'Mace', 'Leather', 'Cloth', 'Shard',
+                 'Essence', 'Silver', 'Gold', 'Dark', 'Crystal')
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+class MemoryFTP:
+    """Замена ftplib.FTP: файлы лежат в словаре, команды отвечают как обычный сервер без MODE Z."""
+    files = {}
+    stamps = {}
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def connect(self, host, port):
+        return '220 ready'
+
+    def login(self, user, password):
+        return '230 logged in'
+
+    def set_pasv(self, value):
+        pass
+
+    def require(self, path):
+        if path not in self.files:
+            raise ftplib.error_perm(f'550 {path}: no such file')
+
+    def voidcmd(self, cmd):
+        command, _, argument = cmd.partition(' ')
+        if command == 'MODE' and argument != 'S':
+            raise ftplib.error_perm('504 unsupported mode')
+        if command == 'RNTO':
+            self.files[argument] = self.files.pop(self.renaming)
+            self.stamps[argument] = self.stamps.pop(self.renaming)
+        return '200 ok'
+
+    def sendcmd(self, cmd):
+        command, _, argument = cmd.partition(' ')
+        self.require(argument)
+        if command == 'MDTM':
+            return f'213 {self.stamps[argument]}'
+        if command == 'RNFR':
+            self.renaming = argument
+            return '350 ready for RNTO'
+        return '200 ok'
+
+    def voidresp(self):
+        return '226 done'
+
+    def size(self, path):
+        self.require(path)
+        return len(self.files[path])
+
+    def retrbinary(self, cmd, callback, blocksize=64 * 1024, rest=None):
+        path = cmd.split(' ', 1)[1]
+        self.require(path)
+        data = self.files[path]
+        for start in range(rest or 0, len(data), blocksize):
+            callback(data[start:start + blocksize])
+        return '226 done'
+
+    def storbinary(self, cmd, fp, blocksize=64 * 1024, callback=None):
+        path = cmd.split(' ', 1)[1]
+        chunks = []
+        for block in iter(lambda: fp.read(blocksize), b''):
+            chunks.append(block)
+            if callback is not None:
+                callback(block)
+        self.files[path] = b''.join(chunks)
+        self.stamps[path] = datetime.now().strftime('%Y%m%d%H%M%S.%f')
+        return '226 done'
+
+    def delete(self, path):
+        self.require(path)
+        del self.files[path]
+        del self.stamps[path]
+
+    def quit(self):
+        return '221 bye'
+
+    def close(self):
+        pass
+
+
+def player_name(rng, players):
+    return f'Player{rng.randrange(players)}'
+
+
+def generate_chat_log(rng, lines, players):
+    """LogOutput.log: чат всех каналов, сообщения KindredCommands, килфид и служебный шум BepInEx."""
+    out = ['[Message:   BepInEx] BepInEx 5.4.21.0 - VRisingServer (%s)' % datetime.now().strftime('%m/%d/%Y %H:%M:%S')]
+    for number in range(lines - 1):
+        kind = rng.random()
+        if kind < 0.5:
+            message = ' '.join(rng.choices(CHAT_WORDS, k=rng.randint(2, 10)))
+            out.append(f'[Info   :Bloodstone] [Chat] [{rng.choice(CHANNELS)}] {player_name(rng, players)}: {message}')
+        elif kind < 0.6:
+            out.append(f'[Info   :KindredCommands] Player {player_name(rng, players)} connected')
+        elif kind < 0.7:
+            out.append(f'[Info   :KindredCommands] {player_name(rng, players)} used .{rng.choice(CHAT_WORDS)}')
+        elif kind < 0.8:
+            out.append(f'[Message:  Killfeed] {player_name(rng, players)} killed {player_name(rng, players)}')
+        else:
+            out.append(f'[Info   :  Unity] Frame {number} took {rng.random() * 30:.2f} ms')
+    return '\n'.join(out) + '\n'
+
+
+def generate_tokens(rng, players):
+    # Богатство распределено неравномерно, как на живом сервере: немногие держат большую часть токенов
+    return [{'CharacterName': f'Player{index}', 'Tokens': int(rng.paretovariate(1.2) * 50) - 50}
+            for index in range(players)]
+
+
+def generate_transactions(rng, count, players):
+    methods = ('transfer', 'shop', 'reward', 'admin')
+    return [{'From': player_name(rng, players), 'To': player_name(rng, players), 'Method': rng.choice(methods),
+             'By': 'admin' if rng.random() < 0.1 else 'system', 'Type': rng.choice(('add', 'remove')),
+             'Amount': rng.randint(1, 500)} for _ in range(count)]
+
+
+def generate_merchants(rng, merchants, items):
+    return [{'name': f'Shop{index}', 'PrefabGUID': rng.randint(-2 ** 31, 2 ** 31 - 1), 'merchantEntity': {},
+             'config': {'IsEnabled': True, 'x': rng.uniform(-3000, 3000), 'z': rng.uniform(-3000, 3000),
+                        'Immortal': True, 'CanMove': False, 'Autorepawn': True},
+             'items': [{'OutputItem': rng.randint(-2 ** 31, 2 ** 31 - 1), 'OutputAmount': rng.randint(1, 100),
+                        'InputItem': rng.randint(-2 ** 31, 2 ** 31 - 1), 'InputAmount': rng.randint(1, 1000),
+                        'StockAmount': rng.randint(1, 100), 'Autorefill': rng.random() < 0.5}
+                       for _ in range(items)]}
+            for index in range(merchants)]
+
+
+def generate_catalog(rng, count):
+    return [(rng.randint(-2 ** 31, 2 ** 31 - 1),
+             f'Item_{rng.choice(CATALOG_WORDS)}_{rng.choice(CATALOG_WORDS)}_T{index % 100:02d}_{index}')
+            for index in range(count)]
+
+
+def generate_bosses(rng, bosses, items):
+    return [{'name': f'Boss{index}', 'nameHash': str(rng.randrange(10 ** 9)), 'AssetName': f'CHAR_Boss{index}',
+             'Hour': '%02d:00' % rng.randrange(24), 'HourDespawn': '%02d:30' % rng.randrange(24),
+             'PrefabGUID': rng.randint(-2 ** 31, 2 ** 31 - 1), 'level': rng.randint(10, 100),
+             'multiplier': rng.randint(1, 5),
+             'items': [{'name': f'Item{item}', 'ItemID': rng.randint(-2 ** 31, 2 ** 31 - 1), 'Stack': rng.randint(1, 50),
+                        'Chance': rng.randint(1, 100), 'Color': '#daa520'} for item in range(items)],
+             'bossSpawn': True, 'Lifetime': 1800,
+             'x': rng.uniform(-3000, 3000), 'y': 0.0, 'z': rng.uniform(-3000, 3000)}
+            for index in range(bosses)]
+
+
+def generate_config(rng, sections, keys):
+    lines = []
+    for section in range(sections):
+        lines.append(f'[Section{section}]')
+        for key in range(keys):
+            value = rng.choice(('true', 'false', str(rng.randint(0, 10 ** 6)), f'text {key} # comment'))
+            lines.append(f'## Описание параметра {key}')
+            lines.append(f'Key{key} = {value}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def generate_server(scale, seed):
+    """Файлы сервера по путям REMOTE_FILES; scale=1 - целевой объём (1M строк лога, 100k игроков, 1M транзакций)."""
+    rng = random.Random(seed)
+    players = max(100, int(100_000 * scale))
+    announcements = [{'Name': f'a{index}', 'Time': '%02d:00' % (index % 24), 'Message': 'Рестарт сервера',
+                      'OneTime': False} for index in range(200)]
+    raid_forge = ['[RaidSchedule]', 'OverrideMode = Normal', 'RaidCheckInterval = 60']
+    for day in DAYS:
+        raid_forge += [f'{day}Start = 18:00:00', f'{day}End = 22:00:00']
+    raid_guard = ['[Config]', 'RaidGuard = true', 'Alliances = false', 'ClanBasedAlliances = true',
+                  'PreventFriendlyFire = true', 'MaxAllianceSize = 4', 'LimitAssists = false', 'AllianceAssists = 2']
+    contents = {
+        'config': generate_config(rng, 50, 40),
+        'merchants': json.dumps(generate_merchants(rng, 10, max(10, int(500 * scale))), indent=2),
+        'tokens': json.dumps(generate_tokens(rng, players), indent=2),
+        'log': json.dumps(generate_transactions(rng, max(100, int(1_000_000 * scale)), players), indent=2),
+        'announcements': json.dumps(announcements, indent=2),
+        'chat_log': generate_chat_log(rng, max(100, int(1_000_000 * scale)), players),
+        'bosses': json.dumps(generate_bosses(rng, 100, max(3, int(30 * scale))), indent=2),
+        'raid_forge': '\n'.join(raid_forge),
+        'raid_guard': '\n'.join(raid_guard),
+    }
+    return {manager.REMOTE_PATHS[key]: text.encode('utf-8') for key, text in contents.items()}
+
+
+class Benchmark:
+    def __init__(self, app, repeat):
+        self.app = app
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, fn, setup=None, repeat=None):
+        # Берётся лучший из повторов: он меньше всего зависит от постороннего шума
+        runs = []
+        value = None
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            value = fn()
+            runs.append(time.perf_counter() - started)
+        self.results[name] = {'seconds': min(runs), 'runs': runs}
+        print(f'{name:<28} {min(runs):9.3f} с', flush=True)
+        return value
+
+    def wait(self, done):
+        while not done():
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.app.processEvents()
+
+
+def run_benchmarks(bench, files, scale=1.0, seed=0):
+    chat_text = files[manager.REMOTE_PATHS['chat_log']].decode('utf-8')
+    lines = chat_text.split('\n')
+
+    # Чат лог: построчный и пакетный разбор, загрузка в просмотрщик, фильтры и поиск
+    viewer = manager.ChatLogViewer()
+    bench.measure('parse_log_line', lambda: [entry for entry in map(viewer.parse_log_line, lines) if entry])
+    bench.measure('parse_log_lines', lambda: list(manager.parse_log_lines(lines)))
+    bench.measure('load_log', lambda: viewer.load_log(chat_text))
+    # Выключение канала: видимые строки собираются заново; включение всех каналов - быстрый путь
+    global_filter = viewer.filters['Global']
+    bench.measure('apply_filters', lambda: global_filter.setChecked(False), setup=lambda: global_filter.setChecked(True))
+    global_filter.setChecked(True)
+    bench.measure('chat_search', lambda: viewer.index.search('"raid castle" from:Player1'))
+
+    # Архив чата: запись всего лога в пустую базу, как при первом подключении к серверу
+    chat_raw = files[manager.REMOTE_PATHS['chat_log']]
+    # Сгенерированный лог - корректный UTF-8, смещения строк можно считать по тексту
+    offsets = list(accumulate((len(line.encode('utf-8')) + 1 for line in lines), initial=0))
+    rows = [(offsets[number],) + entry for number, entry in manager.parse_log_lines(lines, numbered=True)]
+    with tempfile.TemporaryDirectory() as archive_dir:
+        archives = []
+
+        def new_archive():
+            archives.append(manager.ChatArchive(os.path.join(archive_dir, f'{len(archives)}.sqlite3')))
+
+        bench.measure('chat_archive_ingest', lambda: archives[-1].ingest('bench', 'bench', 0, chat_raw, rows),
+                      setup=new_archive)
+        for archive in archives:
+            archive.db.close()
+
+    # Экономика: разбор файлов и заполнение статистики
+    tokens_raw = files[manager.REMOTE_PATHS['tokens']]
+    log_raw = files[manager.REMOTE_PATHS['log']]
+    tokens = bench.measure('parse_tokens', lambda: manager.parse_remote_file(tokens_raw, 'json'))
+    log = bench.measure('parse_transactions', lambda: manager.parse_remote_file(log_raw, 'transactions'))
+    tracker = manager.CurrencyTracker()
+    bench.measure('currency_load_data', lambda: tracker.load_data(tokens, log))
+
+    # Настройки
+    config_text = files[manager.REMOTE_PATHS['config']].decode('utf-8')
+    editor = manager.ConfigEditor()
+    bench.measure('config_load', lambda: editor.load_config(config_text))
+    bench.measure('config_get', editor.get_config)
+
+    # Магазин: переключение по всем торговцам и сборка merchants.json из моделей товаров
+    products = manager.ProductsEditor()
+    products.load_merchants(json.loads(files[manager.REMOTE_PATHS['merchants']]))
+    merchant_count = products.merchant_list.count()
+    bench.measure('merchant_switch', lambda: [products.merchant_list.setCurrentIndex(index)
+                                              for index in range(merchant_count)],
+                  setup=lambda: products.merchant_list.setCurrentIndex(0))
+    bench.measure('merchants_get', products.get_merchants)
+
+    # Справочник предметов: построение индексов и подсказки при наборе
+    pairs = generate_catalog(random.Random(seed), max(1000, int(30000 * scale)))
+    catalog = bench.measure('catalog_build', lambda: manager.ItemCatalog(pairs))
+    bench.measure('catalog_search', lambda: [catalog.search(text) for text in ('item_gold', 'ruby_axe', 't42', 'gem')])
+
+
+def run_cycle(bench, files):
+    """Полный цикл окна: загрузка всех файлов с разбором и заполнением вкладок, затем сохранение."""
+    # Окна с сообщениями модальны и без пользователя не закроются
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.critical = staticmethod(lambda parent, title, text, *args: sys.exit(f'{title}: {text}'))
+    window = manager.MainWindow()
+    settings = window.ftp_connection
+    settings.cache_size_input.setValue(0)
+    settings.compression_input.setChecked(False)
+    settings.heartbeat_input.setValue(0)
+    settings.connections_input.setValue(3)
+    for index in range(window.tabs.count()):
+        window.tabs.setCurrentIndex(index)
+    window.set_connection(manager.open_ftp(None, *settings.connection_params()))
+
+    def loaded():
+        return window.task is None and not window.parse_tasks and not window.raw_files
+
+    def load():
+        MemoryFTP.files.update(files)
+        window.load_configs()
+        bench.wait(loaded)
+
+    # Включает и запись лога чата в архив: load_configs ждёт окончания разбора всех файлов
+    bench.measure('load_configs', load)
+
+    def edit():
+        window.boss_editor.name_input.setText(f'Boss {time.perf_counter()}')
+        window.products_editor.merchant_name.setText(f'Shop {time.perf_counter()}')
+        window.raid_editor.max_alliance_size.setValue(window.raid_editor.max_alliance_size.value() % 10 + 1)
+
+    def save():
+        window.save_all()
+        bench.wait(lambda: window.task is None)
+
+    bench.measure('save_all', save, setup=edit)
+    saved = json.loads(MemoryFTP.files[manager.REMOTE_PATHS['bosses']])[0]['name']
+    if saved != window.boss_editor.name_input.text():
+        sys.exit('save_all: изменения не дошли до сервера')
+    window.connection.stop()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    print(f'\nСравнение с {baseline_path}:')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['seconds'], result['seconds']
+        ratio = after / before if before else float('inf')
+        marker = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            marker = '  <- замедление'
+        print(f'{name:<28} {before:9.3f} -> {after:9.3f} с  x{ratio:5.2f}{marker}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности на синтетических данных')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='объём данных: 1 - 1M строк лога, 100k игроков, 1M транзакций')
+    parser.add_argument('--repeat', type=int, default=1, help='повторов каждого замера (берётся лучший)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='куда записать результаты (JSON)')
+    parser.add_argument('--compare', metavar='BASELINE', help='сравнить с результатами прошлого запуска')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимое замедление, доля (0.2 = 20%%)')
+    parser.add_argument('--skip-cycle', action='store_true', help='без полного цикла загрузки и сохранения')
+    args = parser.parse_args()
+
+    # Архив чата и кэш - во временных каталогах тестового режима, а не в данных пользователя
+    QStandardPaths.setTestModeEnabled(True)
+    app = QApplication.instance() or QApplication(sys.argv)
+    ftplib.FTP = MemoryFTP
+    data_root = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation),
+                             'V Rising Server Manager')
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(os.path.join(data_root, 'chat_archive.sqlite3' + suffix))
+        except OSError:
+            pass
+
+    bench = Benchmark(app, max(1, args.repeat))
+    started = time.perf_counter()
+    files = generate_server(args.scale, args.seed)
+    print(f'Данные сгенерированы за {time.perf_counter() - started:.1f} с: '
+          f'{sum(map(len, files.values())) / 1024 / 1024:.1f} МБ', flush=True)
+    run_benchmarks(bench, files, args.scale, args.seed)
+    if not args.skip_cycle:
+        run_cycle(bench, files)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'seed': args.seed,
+            'repeat': bench.repeat,
+            'bytes': {key: len(files[path]) for key, path in manager.REMOTE_PATHS.items()},
+        },
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        regressions = compare(bench.results, args.compare, args.threshold)
+        if regressions:
+            print(f'Замедление больше {args.threshold:.0%}: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,1505 @@
 import sys
+import time
+
+# Замер запуска (--profile-startup): время каждого импорта верхнего уровня
+STARTUP_BEGIN = time.perf_counter()
+IMPORT_TIMES = {}
+_timed_import = None  # Обёртка __import__ на время замера, снимается после отчёта
+if '--profile-startup' in sys.argv:
+    import builtins
+    _original_import = builtins.__import__
+    _import_depth = [0]
+
+    def _timed_import(name, *args, **kwargs):
+        # Учитываем только внешний импорт, вложенные входят в его время
+        _import_depth[0] += 1
+        started = time.perf_counter()
+        try:
+            return _original_import(name, *args, **kwargs)
+        finally:
+            _import_depth[0] -= 1
+            if _import_depth[0] == 0:
+                root = name.split('.')[0]
+                IMPORT_TIMES[root] = IMPORT_TIMES.get(root, 0) + time.perf_counter() - started
+
+    builtins.__import__ = _timed_import
+
+import os
+import re
 import json
+import codecs
+import functools
+import cProfile
+from collections import deque
+from itertools import accumulate, islice
+from bisect import bisect_left, bisect_right
+from array import array
+import queue
+import sqlite3
+import hashlib
+import zlib
 import ftplib
-from datetime import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
 from io import BytesIO
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout,
-                             QLabel, QLineEdit, QPushButton, QTreeWidget, QTreeWidgetItem, QTableWidget,
-                             QTableWidgetItem, QDialog, QFormLayout, QSpinBox, QCheckBox, QMessageBox,
-                             QSplitter, QHeaderView, QComboBox, QInputDialog, QDoubleSpinBox)
-from PyQt5.QtCore import Qt, QSettings
-import numpy as np
-import pandas as pd
+                             QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QDialog,
+                             QFormLayout, QSpinBox, QCheckBox, QMessageBox, QSplitter, QHeaderView, QComboBox,
+                             QInputDialog, QDoubleSpinBox, QTableView, QProgressBar, QTreeView,
+                             QStyledItemDelegate, QDateEdit, QFileDialog, QCompleter)
+from PyQt5.QtGui import QStandardItemModel, QStandardItem
+from PyQt5.QtCore import (Qt, QDate, QSettings, QAbstractItemModel, QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
+                          QStringListModel, QObject, QRunnable, QThreadPool, QStandardPaths, QEvent, QTimer, pyqtSignal)
+# numpy, pandas и matplotlib импортируются внутри функций, которым они нужны:
+# на пути запуска они не используются, а их загрузка занимает секунды
+
+# Источник строки лога: чат Bloodstone, KindredCommands или Killfeed
+LOG_SOURCE_RE = re.compile(
+    r'\[(?:(?P<chat>Info   :Bloodstone\] \[Chat\])'
+    r'|(?P<kindred>Info   :KindredCommands\])'
+    r'|(?P<killfeed>(?P<level>Message|Warning|Info   ):  Killfeed\]))'
+)
+# Канал и отправитель сообщения чата: "[Global] Имя: текст"
+CHAT_MESSAGE_RE = re.compile(r'\s*\[(?P<channel>Global|Team|Local|Whisper)\](?P<sender>[^:]*):(?P<message>.*)')
+
+LOG_TIME_RE = re.compile(r'(\d{1,2}):(\d{2}):(\d{2})')
+
+def parse_log_lines(lines, numbered=False):
+    """Разбирает пачку строк лога за один проход, выдавая (время, тип, отправитель, сообщение).
+
+    Строки без собственного времени получают одну общую метку на всю пачку.
+    С numbered=True выдаёт пары (номер строки в пачке, запись).
+    """
+    fallback_time = None
+    for number, line in enumerate(lines):
+        match = LOG_SOURCE_RE.search(line)
+        if match is None:
+            continue
+        kind = match.lastgroup
+        rest = line[match.end():]
+        if kind == 'chat':
+            chat = CHAT_MESSAGE_RE.match(rest.split('[Chat]', 1)[0])
+            if chat is None:
+                continue
+            record = (chat.group('channel'), chat.group('sender').strip(), chat.group('message').strip())
+        elif kind == 'kindred':
+            channel = 'Players' if 'Player' in line else 'Commands'
+            record = (channel, 'System', rest.split('KindredCommands]', 1)[0].strip())
+        else:
+            if match.group('level') == 'Info   ' and 'killed' not in line.lower():
+                continue
+            record = ('Killfeed', 'System', rest.split('Killfeed]', 1)[0].strip())
+
+        # Время - последнее слово внутри первых скобок строки, если это ЧЧ:ММ:СС
+        parts = line[:line.find(']')].strip('[').split()
+        if len(parts) > 1 and LOG_TIME_RE.fullmatch(parts[-1]):
+            timestamp = parts[-1]
+        else:
+            if fallback_time is None:
+                fallback_time = datetime.now().strftime("%H:%M:%S")
+            timestamp = fallback_time
+        yield (number, (timestamp,) + record) if numbered else (timestamp,) + record
+
+CHAT_WORD_RE = re.compile(r'\w+')
+CHAT_QUERY_RE = re.compile(r'(?:from|от):(?:"(?P<quoted_sender>[^"]*)"|(?P<sender>\S+))|"(?P<phrase>[^"]*)"|(?P<term>\S+)', re.IGNORECASE)
+
+class ChatIndex:
+    """Обратный индекс чата: слово, отправитель и канал -> номера записей.
+
+    Номера записей растут при дописывании, поэтому списки всегда отсортированы.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.terms = {}
+        self.senders = {}
+        self.channels = {}
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, entries):
+        terms, senders, channels = self.terms, self.senders, self.channels
+        for entry_id, (timestamp, channel, sender, message) in enumerate(entries, len(self.messages)):
+            lowered = message.lower()
+            self.messages.append(lowered)
+            # Позиции каналов - компактные array('i'), из них собирается видимый набор строк
+            if channel not in channels:
+                channels[channel] = array('i')
+            channels[channel].append(entry_id)
+            senders.setdefault(sender.lower(), []).append(entry_id)
+            for word in set(CHAT_WORD_RE.findall(lowered)):
+                terms.setdefault(word, []).append(entry_id)
+
+    def intersect(self, postings):
+        postings = sorted(postings, key=len)
+        if not postings:
+            return None
+        result = postings[0]
+        for posting in postings[1:]:
+            if not result:
+                break
+            if len(result) * 16 > len(posting):
+                members = set(posting)
+                result = [entry_id for entry_id in result if entry_id in members]
+                continue
+            # Короткий список ищем двоичным поиском в длинном: O(k log n) вместо обхода всего списка
+            found = []
+            low = 0
+            for entry_id in result:
+                low = bisect_left(posting, entry_id, low)
+                if low == len(posting):
+                    break
+                if posting[low] == entry_id:
+                    found.append(entry_id)
+            result = found
+        return result
+
+    def search(self, query):
+        """Номера записей по запросу: слова, "фраза" и from:Игрок объединяются по И.
+
+        Пустой запрос возвращает None - фильтр по тексту не применяется.
+        """
+        postings = []
+        phrases = []
+        for match in CHAT_QUERY_RE.finditer(query):
+            sender = match.group('sender') or match.group('quoted_sender')
+            if sender is not None:
+                postings.append(self.senders.get(sender.lower(), []))
+                continue
+            text = (match.group('phrase') or match.group('term') or '').lower()
+            words = CHAT_WORD_RE.findall(text)
+            postings.extend(self.terms.get(word, []) for word in words)
+            if match.group('phrase') is not None and len(words) > 1:
+                phrases.append(text)
+        result = self.intersect(postings)
+        if result is None or not phrases:
+            return result
+        # Слова фразы уже найдены по индексу, остаётся проверить их порядок в кандидатах
+        messages = self.messages
+        return [entry_id for entry_id in result if all(phrase in messages[entry_id] for phrase in phrases)]
+
+class ChatArchive:
+    """Локальный архив чата в SQLite: переживает перезапись LogOutput.log при рестарте сервера.
+
+    Запись определяется сервером, поколением лога и байтовым смещением строки, поэтому повторная
+    загрузка тех же строк ничего не дублирует. Поколение - метка LogTail, новая после каждого сброса;
+    лог, заново прочитанный с начала, узнаётся по байтам перед концом уже заархивированной части.
+    """
+    BATCH_SIZE = 5000
+    CHECK_SIZE = 256  # Сколько байт перед концом заархивированной части сверяется при повторном чтении
+    CANDIDATES = 20  # Сколько последних поколений сервера проверяется при таком чтении
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY,
+            server TEXT NOT NULL,
+            generation TEXT NOT NULL,
+            UNIQUE (server, generation)
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            source INTEGER NOT NULL REFERENCES sources (id),
+            offset INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            type TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            message TEXT NOT NULL,
+            UNIQUE (source, offset)
+        );
+        CREATE INDEX IF NOT EXISTS entries_type ON entries (type);
+        CREATE INDEX IF NOT EXISTS entries_sender ON entries (sender COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS entries_time ON entries (day, timestamp);
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Вставка идёт из рабочего потока разбора, запросы - из GUI; доступ сериализуется блокировкой
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # WAL без fsync на каждую транзакцию: при сбое теряются лишь последние пачки, которые докачаются снова
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.lock, self.db:
+            self.db.executescript(self.SCHEMA)
+            # Конец заархивированной части лога, её контрольные байты и точка отсчёта дней
+            columns = {row[1] for row in self.db.execute('PRAGMA table_info(sources)')}
+            for column, declaration in (('end_offset', 'INTEGER NOT NULL DEFAULT 0'),
+                                        ('check_size', 'INTEGER NOT NULL DEFAULT 0'),
+                                        ('check_hash', "TEXT NOT NULL DEFAULT ''"),
+                                        ('day', 'TEXT'), ('clock', 'INTEGER')):
+                if column not in columns:
+                    self.db.execute(f'ALTER TABLE sources ADD COLUMN {column} {declaration}')
+
+    def resolve_source(self, server, generation, chunk_offset, chunk):
+        # Вызывается под блокировкой в транзакции
+        row = self.db.execute('SELECT id FROM sources WHERE server = ? AND generation = ?',
+                              (server, generation)).fetchone()
+        if row is not None:
+            return row[0]
+        if chunk_offset == 0:
+            # Лог прочитан с начала после сброса: если байты перед концом одного из прежних поколений
+            # совпали, это тот же файл и поколение переходит к новой метке
+            candidates = self.db.execute(
+                'SELECT id, end_offset, check_size, check_hash FROM sources WHERE server = ? AND end_offset > 0 '
+                'ORDER BY id DESC LIMIT ?', (server, self.CANDIDATES)).fetchall()
+            for source, end, size, check in candidates:
+                if end <= len(chunk) and content_hash(chunk[end - size:end]) == check:
+                    self.db.execute('UPDATE sources SET generation = ? WHERE id = ?', (generation, source))
+                    return source
+        return self.db.execute('INSERT INTO sources (server, generation) VALUES (?, ?)',
+                               (server, generation)).lastrowid
+
+    def ingest(self, server, generation, chunk_offset, chunk, rows):
+        """Добавляет строки (смещение, время, тип, отправитель, сообщение) куска лога, возвращает число новых.
+
+        chunk - сырые байты куска с начала chunk_offset, по ним узнаётся уже заархивированный лог.
+        """
+        with self.lock, self.db:
+            source = self.resolve_source(server, generation, chunk_offset, chunk)
+            end, day, clock = self.db.execute('SELECT end_offset, day, clock FROM sources WHERE id = ?',
+                                              (source,)).fetchone()
+        # Строки, уже лежащие в архиве (тот же лог прочитан заново), в отсчёт дней не входят
+        rows = [row for row in rows if row[0] >= end]
+        days, day, clock = log_days([row[1] for row in rows], day, clock)
+        inserted = 0
+        for start in range(0, len(rows), self.BATCH_SIZE):
+            batch = [(source, offset, row_day, timestamp, channel, sender, message)
+                     for (offset, timestamp, channel, sender, message), row_day
+                     in zip(rows[start:start + self.BATCH_SIZE], days[start:start + self.BATCH_SIZE])]
+            with self.lock, self.db:
+                before = self.db.total_changes
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO entries (source, offset, day, timestamp, type, sender, message) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+                inserted += self.db.total_changes - before
+        if chunk and chunk_offset + len(chunk) > end:
+            window = chunk[-self.CHECK_SIZE:]
+            with self.lock, self.db:
+                self.db.execute('UPDATE sources SET end_offset = ?, check_size = ?, check_hash = ?, day = ?, clock = ? '
+                                'WHERE id = ?', (chunk_offset + len(chunk), len(window), content_hash(window),
+                                                 day, clock, source))
+        return inserted
+
+    def query(self, server, channels, sender=None, words=(), since=None, until=None, limit=1000, offset=0):
+        """Страница записей (время, тип, отправитель, сообщение, день) в порядке поступления."""
+        channels = list(channels)
+        if not channels:
+            return []
+        conditions = ['source IN (SELECT id FROM sources WHERE server = ?)', 'type IN (%s)' % ', '.join('?' * len(channels))]
+        params = [server] + channels
+        if sender is not None:
+            conditions.append('sender = ? COLLATE NOCASE')
+            params.append(sender)
+        for word in words:
+            conditions.append("message LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', word) + '%')
+        if since is not None:
+            conditions.append('day >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('day <= ?')
+            params.append(until)
+        sql = ('SELECT timestamp, type, sender, message, day FROM entries WHERE %s ORDER BY id LIMIT ? OFFSET ?'
+               % ' AND '.join(conditions))
+        with self.lock:
+            return self.db.execute(sql, params + [limit, offset]).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+DAY_ROLLBACK = 3600  # Насколько время должно уйти назад, чтобы это считалось переходом через полночь, с
+
+def log_days(timestamps, day=None, clock=None, now=None):
+    """Дни для меток времени лога по порядку строк; возвращает (дни, день и время последней метки).
+
+    Время, ушедшее назад больше чем на час, означает следующий день. Без точки отсчёта (новое
+    поколение) последняя метка считается сегодняшней (вчерашней, если она позже текущего времени),
+    а день первой строки отсчитывается от неё назад по числу переходов. Метки не в формате ЧЧ:ММ:СС
+    получают день предыдущей строки.
+    """
+    seconds = []
+    for timestamp in timestamps:
+        match = LOG_TIME_RE.fullmatch(timestamp.strip())
+        seconds.append(None if match is None else
+                       int(match.group(1)) * 3600 + int(match.group(2)) * 60 + int(match.group(3)))
+    if day is None:
+        now = now or datetime.now()
+        valid = [value for value in seconds if value is not None]
+        rollovers = sum(previous - value > DAY_ROLLBACK for previous, value in zip(valid, valid[1:]))
+        current = now.date()
+        if valid and valid[-1] > now.hour * 3600 + now.minute * 60 + now.second:
+            current -= timedelta(days=1)
+        current -= timedelta(days=rollovers)
+        previous = None
+    else:
+        current = date.fromisoformat(day)
+        previous = clock
+    days = []
+    for value in seconds:
+        if value is not None:
+            if previous is not None and previous - value > DAY_ROLLBACK:
+                current += timedelta(days=1)
+            previous = value
+        days.append(current.isoformat())
+    return days, current.isoformat(), previous
+
+class LogTail:
+    """Докачка удалённого лога: забирает только новые байты через REST + RETR."""
+    OVERLAP = 256  # Сколько уже прочитанных байт перечитываем для проверки ротации
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.size = 0
+        self.overlap = b''
+        # Каждый сброс (подключение, ручная перезагрузка, усечение или ротация лога) начинает новое
+        # поколение; тот ли это файл, что уже в архиве, архив решает сам по его байтам
+        self.generation = os.urandom(8).hex()
+
+    def remote_size(self, ftp):
+        try:
+            ftp.voidcmd('TYPE I')
+            return ftp.size(self.path)
+        except ftplib.error_perm:
+            # Сервер не поддерживает SIZE - полагаемся только на проверку перекрытия
+            return None
+
+    def fetch(self, ftp, worker=None, compress=False):
+        """Возвращает (байты новых полных строк, смещение их начала, был ли сброс на 0)."""
+        restarted = False
+        size = self.remote_size(ftp)
+        if size is not None and size < self.offset:
+            # Файл усечён или перезаписан после рестарта сервера
+            self.reset()
+            restarted = True
+        elif size is not None and size == self.offset and self.offset:
+            return b'', self.offset, False
+
+        start = self.offset - len(self.overlap)
+        data = retrieve_file(ftp, self.path, worker, rest=start, compress=compress, sibling=False)
+        if self.overlap:
+            if data[:len(self.overlap)] != self.overlap:
+                # Начало хвоста не совпало с прочитанным ранее - лог ротирован
+                self.reset()
+                restarted = True
+                data = retrieve_file(ftp, self.path, worker, compress=compress, sibling=False)
+            else:
+                data = data[len(self.overlap):]
+
+        # Незавершённую последнюю строку оставляем до следующего обновления
+        cut = data.rfind(b'\n') + 1
+        chunk = data[:cut]
+        chunk_offset = self.offset
+        self.offset += cut
+        self.size = size if size is not None else self.offset + len(data) - cut
+        self.overlap = (self.overlap + chunk)[-self.OVERLAP:]
+        return chunk, chunk_offset, restarted
+
+FTP_TIMEOUT = 30  # Таймаут сокета FTP в секундах
+
+# Файлы, загружаемые после подключения: (ключ, путь на сервере, формат)
+REMOTE_FILES = [
+    ('config', '/BepInEx/config/BloodyRewards.cfg', 'text'),
+    ('merchants', '/BepInEx/config/BloodyMerchant/merchants.json', 'json'),
+    ('tokens', '/BepInEx/config/BloodyWallet/tokens.json', 'json'),
+    ('log', '/BepInEx/config/BloodyWallet/log.json', 'transactions'),
+    ('announcements', '/BepInEx/config/KindredCommands/announcements.json', 'json'),
+    ('chat_log', '/BepInEx/LogOutput.log', 'tail'),
+    ('bosses', '/BepInEx/config/BloodyBoss/Bosses.json', 'json'),
+    ('raid_forge', '/BepInEx/config/RaidForge.cfg', 'text'),
+    ('raid_guard', '/BepInEx/config/io.zfolmt.RaidGuard.cfg', 'text'),
+]
+REMOTE_PATHS = {key: path for key, path, _ in REMOTE_FILES}
+FILE_KINDS = {key: kind for key, _, kind in REMOTE_FILES}
+# Файлы, которые редактируются и сохраняются обратно на сервер
+SAVED_FILES = ['config', 'merchants', 'announcements', 'bosses', 'raid_forge', 'raid_guard']
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+class TaskCancelled(Exception):
+    pass
+
+class WorkerSignals(QObject):
+    file_started = pyqtSignal(str, int, int)  # Путь, номер файла, всего файлов
+    progress = pyqtSignal(str, int, int)  # Путь, передано байт, размер файла (0 - неизвестен)
+    compressed = pyqtSignal(str, int, int)  # Путь, получено по сети байт, размер после распаковки
+    result = pyqtSignal(str, object)  # Ключ файла, готовые к показу данные
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+class Worker(QRunnable):
+    """Выполняет fn(worker, *args) в пуле потоков, с GUI общается только сигналами."""
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+        self.profile = None  # OperationProfile, если операцию нужно профилировать
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def check_cancelled(self):
+        if self.is_cancelled:
+            raise TaskCancelled()
+
+    def run(self):
+        try:
+            result = self.profiled(self.fn)(self, *self.args)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+    def profiled(self, fn):
+        # Задачи, которые рабочая функция раздаёт своим потокам, попадают в тот же профиль
+        return fn if self.profile is None else self.profile.wrap(fn)
+
+class StageTimings:
+    """Замеры этапов операций по файлам: connect, retr, decode, parse, populate, serialize, stor.
+
+    Пишется из любых потоков; вкладка диагностики забирает новые записи по их общему числу.
+    """
+    LIMIT = 20000  # Сколько последних замеров хранится
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = deque(maxlen=self.LIMIT)
+        self.total = 0  # Замеров за всё время, включая вытесненные
+        self.run = 0
+        self.current = None  # (операция, номер запуска), к которой относятся замеры без явного run
+
+    def begin(self, operation):
+        with self.lock:
+            self.run += 1
+            self.current = (operation, self.run)
+            return self.current
+
+    @contextmanager
+    def span(self, stage, file=None, run=None, **fields):
+        """Замер блока; в выданный словарь можно дописать поля, известные только в конце (bytes)."""
+        operation, number = run or self.current or ('', 0)
+        record = {'operation': operation, 'run': number, 'stage': stage, 'file': file,
+                  'thread': threading.current_thread().name, 'started': time.time(), **fields}
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            with self.lock:
+                self.records.append(record)
+                self.total += 1
+
+    def since(self, seen):
+        """Замеры, добавленные после первых seen; (записи, новое число, были ли вытеснены непрочитанные)."""
+        with self.lock:
+            fresh = self.total - seen
+            if fresh > len(self.records):
+                return list(self.records), self.total, True
+            return list(islice(self.records, len(self.records) - fresh, None)), self.total, False
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.total = 0
+
+TIMINGS = StageTimings()
+
+# Имя операции (connect, load_configs, load_chat_log, save_all), для которой снимается cProfile;
+# профиль пишется в каталог PROFILE_DIR_ENV или в текущий
+PROFILE_ENV = 'VRSM_PROFILE'
+PROFILE_DIR_ENV = 'VRSM_PROFILE_DIR'
+
+class OperationProfile:
+    """cProfile одной операции во всех её потоках: у каждого потока свой профилировщик, при записи они складываются."""
+    def __init__(self, operation):
+        self.operation = operation
+        self.lock = threading.Lock()
+        self.profiles = []
+
+    @contextmanager
+    def running(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: профилировщик один на интерпретатор и уже видит этот поток
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.profiles.append(profile)
+
+    def wrap(self, fn):
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            with self.running():
+                return fn(*args, **kwargs)
+        return profiled
+
+    def dump(self):
+        import pstats
+        with self.lock:
+            profiles, self.profiles = self.profiles, []
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        folder = os.environ.get(PROFILE_DIR_ENV) or os.getcwd()
+        path = os.path.join(folder, f'{self.operation}-{datetime.now():%Y%m%d-%H%M%S}.prof')
+        stats.dump_stats(path)
+        return path
+
+PROGRESS_STEP = 256 * 1024  # Как часто сообщать о ходе передачи, в байтах
+
+# Большие текстовые файлы, которые имеет смысл передавать сжатыми (сжимаются в 10-20 раз)
+COMPRESSED_FILES = {'log', 'chat_log'}
+
+def enable_mode_z(ftp):
+    """Включает MODE Z (поток данных сжат zlib); ответ сервера запоминается на соединении."""
+    if getattr(ftp, 'mode_z', None) is False:
+        return False
+    try:
+        ftp.voidcmd('MODE Z')
+    except ftplib.error_perm:
+        ftp.mode_z = False
+        return False
+    ftp.mode_z = True
+    return True
+
+def compressed_sibling(ftp, path):
+    """Путь к заранее сжатой копии path + '.gz', если она есть и не старше самого файла."""
+    try:
+        original = ftp.sendcmd(f'MDTM {path}')[4:].strip()
+        packed = ftp.sendcmd(f'MDTM {path}.gz')[4:].strip()
+    except ftplib.error_perm:
+        return None
+    return f'{path}.gz' if packed >= original else None
+
+def retrieve_file(ftp, path, worker=None, rest=None, size=None, compress=False, sibling=True, sink=None):
+    # sibling=False запрещает читать копию .gz: она может отставать от дописываемого файла.
+    # С sink (write/reset) блоки уходят в него по мере получения, а не копятся в памяти; возвращается None
+    total = 0 if size is None else size - (rest or 0)
+    if worker is not None and size is None:
+        try:
+            ftp.voidcmd('TYPE I')
+            total = (ftp.size(path) or 0) - (rest or 0)
+        except ftplib.error_perm:
+            pass
+    buffer = BytesIO()
+    reported = [0]
+    written = [0]
+
+    def write(block):
+        if sink is None:
+            buffer.write(block)
+        else:
+            sink.write(block)
+        written[0] += len(block)
+        if worker is not None:
+            worker.check_cancelled()
+            received = written[0]
+            if received - reported[0] >= PROGRESS_STEP:
+                reported[0] = received
+                worker.signals.progress.emit(path, received, max(total, 0))
+
+    # Сжатие только для чтения с начала: смещение REST в сжатом потоке не переносится
+    source = path
+    decompressor = None
+    mode_z = compress and not rest and enable_mode_z(ftp)
+    if mode_z:
+        decompressor = zlib.decompressobj()
+    elif compress and not rest and sibling:
+        source = compressed_sibling(ftp, path) or path
+        if source != path:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = [0]
+
+    def receive(block):
+        # Распаковка по мере поступления блоков, в буфер попадает уже исходный текст
+        received[0] += len(block)
+        write(decompressor.decompress(block))
+
+    with TIMINGS.span('retr', path, rest=rest or 0, compressed=decompressor is not None) as timing:
+        try:
+            ftp.retrbinary(f'RETR {source}', write if decompressor is None else receive, rest=rest or None)
+        except TaskCancelled:
+            try:
+                # Дочитываем ответ сервера на прерванную передачу, чтобы соединение осталось рабочим
+                ftp.voidresp()
+            except ftplib.all_errors:
+                pass
+            raise
+        finally:
+            if mode_z:
+                try:
+                    ftp.voidcmd('MODE S')
+                except ftplib.all_errors:
+                    pass
+        if decompressor is not None:
+            write(decompressor.flush())
+            # Поток без конца (или с лишними данными после него) - передача или копия .gz неполная
+            complete = decompressor.eof and not decompressor.unused_data
+        timing['bytes'] = received[0] if decompressor is not None else written[0]
+        timing['size'] = written[0]
+        if decompressor is not None and complete and worker is not None:
+            worker.signals.compressed.emit(path, received[0], written[0])
+    if decompressor is not None and not complete:
+        if source != path:
+            if sink is not None:
+                # Приёмник уже получил часть копии - начинает заново с самого файла
+                sink.reset()
+            return retrieve_file(ftp, path, worker, rest, size, sink=sink)
+        raise ftplib.error_proto(f'Сжатый поток {path} оборван')
+    if worker is not None:
+        worker.signals.progress.emit(path, written[0], written[0])
+    return buffer.getvalue() if sink is None else None
+
+def remote_stamp(ftp, path):
+    """Возвращает (MDTM, SIZE) файла или None, если сервер их не поддерживает."""
+    try:
+        ftp.voidcmd('TYPE I')
+        mdtm = ftp.sendcmd(f'MDTM {path}')[4:].strip()
+        size = ftp.size(path)
+    except ftplib.error_perm:
+        return None
+    if size is None:
+        return None
+    return mdtm, size
+
+class FileCache:
+    """Локальные копии файлов сервера, проверяемые по MDTM/SIZE, с вытеснением давно не используемых."""
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = {}
+        try:
+            with open(os.path.join(root, self.INDEX_NAME), encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def entry_key(self, host, path):
+        return hashlib.sha1(f'{host}{path}'.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key + '.bin')
+
+    def get(self, host, path, stamp):
+        f = self.open(host, path, stamp)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def open(self, host, path, stamp):
+        """Открытая на чтение копия файла или None: большие файлы читаются из неё кусками."""
+        key = self.entry_key(host, path)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None or [entry['mdtm'], entry['size']] != list(stamp):
+                return None
+            try:
+                f = open(self.entry_path(key), 'rb')
+            except OSError:
+                self.index.pop(key, None)
+                return None
+            entry['used'] = time.time()
+            self.save_index()
+            return f
+
+    def spool(self):
+        # Временный файл рядом с копиями: в него пишется скачиваемый файл, put_file переносит его в кэш
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.root, suffix='.part', delete=False)
+
+    def put_file(self, host, path, stamp, source):
+        """Как put, но для готового файла source на диске (из spool)."""
+        size = os.path.getsize(source)
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            os.remove(source)
+            return
+        key = self.entry_key(host, path)
+        with self.lock:
+            os.replace(source, self.entry_path(key))
+            self.index[key] = {
+                'host': host, 'path': path, 'mdtm': stamp[0], 'size': stamp[1],
+                'bytes': size, 'used': time.time()
+            }
+            self.evict()
+            self.save_index()
+
+    def put(self, host, path, stamp, data):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        key = self.entry_key(host, path)
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.entry_path(key), 'wb') as f:
+                f.write(data)
+            self.index[key] = {
+                'host': host, 'path': path, 'mdtm': stamp[0], 'size': stamp[1],
+                'bytes': len(data), 'used': time.time()
+            }
+            self.evict()
+            self.save_index()
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+            self.save_index()
+
+    def evict(self):
+        # Удаляем самые давно использованные копии, пока кэш не уложится в лимит
+        total = sum(entry['bytes'] for entry in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]['used']):
+            if total <= max(self.max_bytes, 0):
+                break
+            self.remove(key)
+            total -= entry['bytes']
+
+    def remove(self, key):
+        self.index.pop(key, None)
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.index):
+                self.remove(key)
+            self.save_index()
+
+    def save_index(self):
+        if not os.path.isdir(self.root):
+            return
+        with open(os.path.join(self.root, self.INDEX_NAME), 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+
+def retrieve_cached(ftp, path, worker, cache, host, compress=False):
+    # Если MDTM и SIZE совпадают с сохранённой копией, RETR не выполняется
+    if cache is None or cache.max_bytes <= 0:
+        return retrieve_file(ftp, path, worker, compress=compress)
+    stamp = remote_stamp(ftp, path)
+    if stamp is None:
+        return retrieve_file(ftp, path, worker, compress=compress)
+    with TIMINGS.span('cache', path) as timing:
+        data = cache.get(host, path, stamp)
+        timing['bytes'] = 0 if data is None else len(data)
+    if data is None:
+        data = retrieve_file(ftp, path, worker, size=stamp[1], compress=compress)
+        cache.put(host, path, stamp, data)
+    return data
+
+def retrieve_transactions(ftp, path, worker, cache, host, compress=False):
+    """log.json сразу в TransactionLog: блоки RETR или копии из кэша разбираются по мере поступления,
+    файл целиком в памяти не бывает. Разбор идёт внутри замера retr."""
+    stamp = remote_stamp(ftp, path) if cache is not None and cache.max_bytes > 0 else None
+    if stamp is not None:
+        with TIMINGS.span('cache', path) as timing:
+            f = cache.open(host, path, stamp)
+            timing['bytes'] = 0 if f is None else stamp[1]
+        if f is not None:
+            with f, TIMINGS.span('parse', path, bytes=stamp[1]):
+                sink = TransactionLogSink()
+                for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                    sink.write(block)
+                return sink.close()
+    spool = cache.spool() if stamp is not None else None
+    try:
+        sink = TransactionLogSink(spool)
+        retrieve_file(ftp, path, worker, size=stamp and stamp[1], compress=compress, sink=sink)
+        log = sink.close()
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.remove(spool.name)
+        raise
+    if spool is not None:
+        spool.close()
+        cache.put_file(host, path, stamp, spool.name)
+    return log
+
+def store_file(ftp, path, data, worker=None, name=None):
+    # name - путь, под которым передача попадает в замеры (при загрузке под временным именем)
+    with TIMINGS.span('stor', name or path, bytes=len(data)), BytesIO(data) as f:
+        if worker is None:
+            ftp.storbinary(f'STOR {path}', f)
+        else:
+            sent = [0]
+
+            def sent_block(block):
+                sent[0] += len(block)
+                worker.signals.progress.emit(path, sent[0], len(data))
+
+            ftp.storbinary(f'STOR {path}', f, callback=sent_block)
+
+JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+class JsonArrayReader:
+    """Разбор JSON-массива по кускам байт: feed возвращает элементы, полученные целиком."""
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.started = False
+        self.done = False  # Закрывающая скобка получена, остаток потока не читается
+
+    def feed(self, block, final=False):
+        records = []
+        if self.done:
+            return records
+        self.buffer += self.text_decoder.decode(block, final=final)
+        buffer = self.buffer
+        pos = 0
+        while True:
+            pos = JSON_WHITESPACE_RE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if not self.started:
+                if char != '[':
+                    raise ValueError('Ожидался массив JSON')
+                self.started = True
+                pos += 1
+            elif char == ',':
+                pos += 1
+            elif char == ']':
+                self.done = True
+                pos += 1
+                break
+            else:
+                try:
+                    record, pos = self.decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    # Элемент получен не полностью - ждём следующий кусок
+                    break
+                records.append(record)
+        self.buffer = buffer[pos:]
+        return records
+
+    def close(self):
+        records = self.feed(b'', final=True)
+        if not self.done:
+            raise ValueError('Неожиданный конец JSON-массива')
+        return records
+
+def iter_json_array(blocks, batch_size=5000):
+    """Читает JSON-массив по кускам байт и выдаёт его элементы пачками, не разбирая файл целиком."""
+    reader = JsonArrayReader()
+    batch = []
+    for block in blocks:
+        batch.extend(reader.feed(block))
+        if len(batch) >= batch_size or reader.done:
+            yield batch
+            batch = []
+        if reader.done:
+            return
+    batch.extend(reader.close())
+    yield batch
+
+BLOCK_SIZE = 64 * 1024
+
+def iter_blocks(data, size=BLOCK_SIZE):
+    view = memoryview(data)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+class TransactionLog:
+    """Лог BloodyWallet по столбцам: строки хранятся кодами общего словаря, суммы - массивом чисел."""
+    TEXT_COLUMNS = ['From', 'To', 'Method', 'By', 'Type']
+    COLUMNS = TEXT_COLUMNS + ['Amount']
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self.columns = {name: array('i') for name in self.TEXT_COLUMNS}
+        self.amounts = array('d')
+
+    @classmethod
+    def from_records(cls, records):
+        log = cls()
+        log.append_records(records)
+        return log
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def append_records(self, records):
+        codes = self.codes
+        for record in records:
+            for name in self.TEXT_COLUMNS:
+                value = record[name]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(self.values)
+                    self.values.append(value)
+                self.columns[name].append(code)
+            self.amounts.append(record['Amount'])
+
+    def amount(self, index):
+        value = self.amounts[index]
+        return int(value) if value.is_integer() else value
+
+    def row(self, index):
+        return [self.values[self.columns[name][index]] for name in self.TEXT_COLUMNS] + [self.amount(index)]
+
+    def records(self):
+        for index in range(len(self)):
+            yield dict(zip(self.COLUMNS, self.row(index)))
+
+class TransactionLogSink:
+    """Приёмник для retrieve_file: строит TransactionLog из блоков log.json по мере скачивания.
+
+    spool - файл на диске, куда параллельно пишется копия для кэша.
+    """
+    BATCH_SIZE = 5000
+
+    def __init__(self, spool=None):
+        self.spool = spool
+        self.reset()
+
+    def reset(self):
+        self.reader = JsonArrayReader()
+        self.log = TransactionLog()
+        self.pending = []
+        if self.spool is not None:
+            self.spool.seek(0)
+            self.spool.truncate()
+
+    def write(self, block):
+        if self.spool is not None:
+            self.spool.write(block)
+        self.pending.extend(self.reader.feed(block))
+        if len(self.pending) >= self.BATCH_SIZE:
+            self.log.append_records(self.pending)
+            self.pending = []
+
+    def close(self):
+        self.pending.extend(self.reader.close())
+        self.log.append_records(self.pending)
+        self.pending = []
+        return self.log
+
+def gini_coefficient(values):
+    import numpy as np
+    values = np.sort(np.clip(np.asarray(values, dtype=np.float64), 0, None))
+    total = values.sum()
+    if len(values) == 0 or total == 0:
+        return 0.0
+    ranks = np.arange(1, len(values) + 1)
+    return float(2 * (ranks * values).sum() / (len(values) * total) - (len(values) + 1) / len(values))
+
+def economy_fingerprint(names, tokens, log):
+    # Отпечаток входных данных: аналитика пересчитывается только если он изменился. Модель токенов
+    # переставляет игроков при сортировке и смене порогов, поэтому кошельки хешируются
+    # в порядке имени и суммы, а не в порядке строк
+    if len(names):
+        import numpy as np
+        order = np.lexsort((tokens, names))
+        names, tokens = names[order], tokens[order]
+    digest = hashlib.sha1()
+    for column in (names, tokens, *log.columns.values(), log.amounts):
+        digest.update(memoryview(column).cast('B') if len(column) else b'')
+    digest.update('\0'.join(log.values).encode('utf-8'))
+    return digest.hexdigest()
+
+def compute_economy(worker, names, tokens, log, top=10):
+    """Показатели экономики по кошелькам (tokens.json) и логу транзакций (log.json)."""
+    import numpy as np
+    import pandas as pd
+    wallets = pd.DataFrame({'CharacterName': names, 'Tokens': tokens})
+    categories = pd.Index(log.values)
+    transactions = pd.DataFrame({
+        name: pd.Categorical.from_codes(np.frombuffer(log.columns[name], dtype=np.int32), categories=categories)
+        for name in TransactionLog.TEXT_COLUMNS
+    })
+    transactions['Amount'] = np.frombuffer(log.amounts, dtype=np.float64)
+
+    inflow = transactions.groupby('To', observed=True)['Amount'].sum()
+    outflow = transactions.groupby('From', observed=True)['Amount'].sum()
+    flows = pd.DataFrame({'inflow': inflow, 'outflow': outflow}).fillna(0)
+    flows['net'] = flows['inflow'] - flows['outflow']
+    flows = flows.sort_values('net', ascending=False)
+    return {
+        'players': len(wallets),
+        'transactions': len(transactions),
+        'supply': int(wallets['Tokens'].sum()),
+        'gini': gini_coefficient(wallets['Tokens'].to_numpy()),
+        'balances': np.sort(np.clip(wallets['Tokens'].to_numpy(), 0, None)),
+        'flows': flows,
+        'by_method': transactions.groupby('Method', observed=True)['Amount'].agg(['count', 'sum']),
+        'by_type': transactions.groupby('Type', observed=True)['Amount'].agg(['count', 'sum']),
+        'top_earners': flows['inflow'].nlargest(top),
+    }
+
+def parse_remote_file(data, kind, path=None, run=None):
+    # path и run - к какому файлу и операции отнести замеры
+    if kind == 'transactions':
+        # Лог транзакций растёт весь вайп - разбираем его потоково сразу в столбцы,
+        # декодирование идёт внутри разбора
+        with TIMINGS.span('parse', path, run, bytes=len(data)):
+            log = TransactionLog()
+            for batch in iter_json_array(iter_blocks(data)):
+                log.append_records(batch)
+        return log
+    with TIMINGS.span('decode', path, run, bytes=len(data)):
+        text = data.decode('utf-8')
+    if kind == 'json':
+        with TIMINGS.span('parse', path, run):
+            return json.loads(text)
+    return text
+
+def open_ftp(worker, host, port, user, password, timeout=FTP_TIMEOUT):
+    with TIMINGS.span('connect', f'{host}:{port}'):
+        ftp = ftplib.FTP(timeout=timeout)
+        ftp.connect(host, port)
+        ftp.login(user, password)
+        ftp.set_pasv(True)
+    return ftp
+
+def fetch_chat_log(worker, ftp, tail, compress=False):
+    # Возвращает (байты новых строк лога, заменить ли ими уже загруженные записи, их смещение, поколение лога)
+    was_empty = tail.offset == 0
+    chunk, chunk_offset, restarted = tail.fetch(ftp, worker, compress)
+    return chunk, was_empty or restarted, chunk_offset, tail.generation
+
+def parse_fetched(worker, key, kind, raw, parse_lines, archive=None, run=None):
+    # Разбор скачанного файла, запускается при первом показе его вкладки;
+    # run - операция, которой файл был скачан (разбор может начаться уже после неё)
+    path = REMOTE_PATHS[key]
+    if kind == 'tail':
+        chunk, replace, chunk_offset, generation = raw
+        with TIMINGS.span('decode', path, run, bytes=len(chunk)):
+            log_text = chunk.decode('utf-8', errors='ignore')
+        with TIMINGS.span('parse', path, run, lines=0) as timing:
+            lines = log_text.split('\n')
+            numbered = parse_lines(lines, numbered=True)
+            timing['lines'] = len(numbered)
+        # Записи уходят в GUI сразу, запись в архив идёт следом в этом же потоке
+        worker.signals.result.emit(key, ([entry for _, entry in numbered], replace))
+        if archive is not None:
+            import numpy as np
+            archive_db, server = archive
+            with TIMINGS.span('archive', path, run, lines=len(numbered)):
+                # Байтовое смещение каждой строки в файле лога - ключ от повторной вставки. Берётся из
+                # сырых байт: '\n' не входит в многобайтовые последовательности UTF-8 и не теряется при
+                # errors='ignore', так что номера строк текста и байт совпадают, а длины - нет
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+                offsets = (np.concatenate(([0], newlines + 1)) + chunk_offset).tolist()
+                archive_db.ingest(server, generation, chunk_offset, chunk,
+                                  [(offsets[number],) + entry for number, entry in numbered])
+        return
+    if kind == 'transactions':
+        # Лог транзакций разобран ещё при скачивании
+        worker.signals.result.emit(key, raw)
+        return
+    worker.signals.result.emit(key, parse_remote_file(raw, kind, path, run))
+
+def merge_tail(pending, raw):
+    """Склеивает ещё не разобранный кусок лога со скачанным после него."""
+    chunk, replace, chunk_offset, generation = raw
+    # Чтение с начала заменяет всё прежнее, как и при показе
+    if replace or generation != pending[3] or chunk_offset != pending[2] + len(pending[0]):
+        return raw
+    return pending[0] + chunk, pending[1], pending[2], generation
+
+def connection_lost(error):
+    """Соединение больше не годится: сетевая ошибка или ответ 421 (сервер закрывает сеанс)."""
+    return isinstance(error, (OSError, EOFError)) or (isinstance(error, ftplib.error_temp)
+                                                      and str(error).startswith('421'))
+
+class FTPPool:
+    """Набор FTP-соединений с одними параметрами для одновременных передач."""
+    IDLE_CHECK = 15  # Соединение, простоявшее дольше стольких секунд, перед выдачей проверяется NOOP
+
+    def __init__(self, params, size, ftp=None):
+        self.params = params
+        self.size = max(1, size)
+        self.idle = queue.LifoQueue()
+        self.slots = threading.Semaphore(self.size)
+        self.count_lock = threading.Lock()
+        self.count = 0  # Открытых соединений, свободных и занятых
+        self.reconnects = 0  # Сколько раз соединение восстанавливалось после обрыва
+        self.closed = False  # После close соединения не открываются и не возвращаются в пул
+        if ftp is not None:
+            self.count = 1
+            self.release(ftp)
+
+    def open(self):
+        ftp = open_ftp(None, *self.params)
+        with self.count_lock:
+            self.count += 1
+        return ftp
+
+    def release(self, ftp):
+        if self.closed:
+            # Передача закончилась уже после закрытия пула
+            self.discard(ftp)
+            return
+        self.idle.put((ftp, time.monotonic()))
+
+    def acquire(self, check=False):
+        while True:
+            try:
+                ftp, released = self.idle.get_nowait()
+            except queue.Empty:
+                return self.open()
+            if not check and time.monotonic() - released < self.IDLE_CHECK:
+                return ftp
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except ftplib.all_errors:
+                # Сервер закрыл простаивавшее соединение - берём следующее или открываем новое
+                self.discard(ftp)
+
+    @contextmanager
+    def connection(self, check=False):
+        # Соединения открываются по мере надобности, но не больше size одновременно
+        with self.slots:
+            ftp = self.acquire(check)
+            try:
+                yield ftp
+            except BaseException as error:
+                # Оборванное соединение больше не используем
+                if connection_lost(error):
+                    self.discard(ftp)
+                else:
+                    self.release(ftp)
+                raise
+            else:
+                self.release(ftp)
+
+    def call(self, fn, *args):
+        """fn(ftp, *args) на соединении пула; при обрыве повторяется один раз на проверенном соединении."""
+        try:
+            with self.connection() as ftp:
+                return fn(ftp, *args)
+        except (OSError, EOFError, ftplib.error_temp) as error:
+            if not connection_lost(error):
+                raise
+            # Сервер мог перезапуститься: остальные свободные соединения перед выдачей проверяются NOOP
+            with self.count_lock:
+                self.reconnects += 1
+        with self.connection(check=True) as ftp:
+            return fn(ftp, *args)
+
+    def discard(self, ftp):
+        with self.count_lock:
+            self.count -= 1
+        try:
+            ftp.close()
+        except ftplib.all_errors:
+            pass
+
+    def keepalive(self):
+        """NOOP на свободных соединениях: мёртвые закрываются, если живых не осталось - открывается новое.
+
+        Возвращает задержку NOOP в секундах или None, если проверять было нечего.
+        Соединения, занятые передачами, не трогаются - они и так активны. Закрытый пул не проверяется.
+        """
+        if self.closed:
+            return None
+        alive = []
+        dead = 0
+        latency = None
+        # Под каждое проверяемое соединение занимаем слот, чтобы его не забрала передача
+        while self.slots.acquire(blocking=False):
+            try:
+                ftp, _ = self.idle.get_nowait()
+            except queue.Empty:
+                self.slots.release()
+                break
+            started = time.perf_counter()
+            try:
+                ftp.voidcmd('NOOP')
+            except ftplib.all_errors:
+                self.discard(ftp)
+                self.slots.release()
+                dead += 1
+                continue
+            elapsed = time.perf_counter() - started
+            latency = elapsed if latency is None else min(latency, elapsed)
+            alive.append(ftp)
+        if not alive and (dead or not self.count) and not self.closed and self.slots.acquire(blocking=False):
+            try:
+                ftp = self.open()
+                started = time.perf_counter()
+                ftp.voidcmd('NOOP')
+                latency = time.perf_counter() - started
+            except BaseException:
+                self.slots.release()
+                raise
+            alive.append(ftp)
+            with self.count_lock:
+                self.reconnects += 1
+        for ftp in alive:
+            self.release(ftp)
+            self.slots.release()
+        return latency
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                ftp, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                self.discard(ftp)
+            else:
+                with self.count_lock:
+                    self.count -= 1
+
+def fetch_remote_files(worker, pool, files, tail, cache=None, compress=()):
+    # Файлы качаются одновременно по соединениям пула, каждый уходит в GUI сразу, как только
+    # скачан; разбор откладывается до первого показа вкладки, кроме лога транзакций - он
+    # разбирается прямо во время передачи. compress - ключи файлов для сжатой передачи
+    host = '%s:%s' % pool.params[:2]
+
+    def fetch(index, key, path, kind):
+        worker.check_cancelled()
+        worker.signals.file_started.emit(path, index, len(files))
+        if kind == 'tail':
+            data = pool.call(lambda ftp: fetch_chat_log(worker, ftp, tail, key in compress))
+        elif kind == 'transactions':
+            data = pool.call(retrieve_transactions, path, worker, cache, host, key in compress)
+        else:
+            data = pool.call(retrieve_cached, path, worker, cache, host, key in compress)
+        worker.signals.result.emit(key, data)
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(worker.profiled(fetch), index, key, path, kind)
+                   for index, (key, path, kind) in enumerate(files, 1)]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            # Останавливаем остальные загрузки, наружу уходит первая ошибка
+            worker.cancel()
+            raise
+
+def upload_name(path, token, suffix='upload'):
+    # Временное имя в том же каталоге (для атомарного RNTO) и с расширением, которое плагины не читают
+    folder, name = path.rsplit('/', 1)
+    return f'{folder}/.{name}.{token}.{suffix}'
+
+def target_exists(error):
+    # Ответ сервера, который не заменяет существующий файл при RNTO ("550 File exists" и подобные)
+    return 'exist' in str(error).lower()
+
+def rename(ftp, source, target):
+    ftp.sendcmd(f'RNFR {source}')
+    ftp.voidcmd(f'RNTO {target}')
+
+def replace_file(ftp, source, target, backup):
+    """Ставит source на место target; возвращает True, если рабочий файл пришлось отодвинуть в backup.
+
+    Любая ошибка RNTO, кроме "файл существует", уходит наружу, рабочий файл при этом не тронут.
+    """
+    try:
+        rename(ftp, source, target)
+        return False
+    except ftplib.error_perm as e:
+        if not target_exists(e):
+            raise
+    # Сервер не заменяет файлы: рабочий файл отодвигаем и возвращаем, если новый не встал на его место
+    rename(ftp, target, backup)
+    try:
+        rename(ftp, source, target)
+    except ftplib.all_errors:
+        rename(ftp, backup, target)
+        raise
+    return True
+
+def store_remote_files(worker, pool, payloads):
+    """Загружает все файлы параллельно под временными именами и только затем переименовывает их на место.
+
+    Если хоть одна загрузка не удалась, временные файлы удаляются, рабочие файлы не меняются.
+    Если не удалась замена, уже заменённые файлы возвращаются из резервных копий, где они есть;
+    остальные перечисляются в ошибке.
+    """
+    token = os.urandom(4).hex()
+    uploaded = []
+    lock = threading.Lock()
+
+    def upload(index, path, data):
+        worker.check_cancelled()
+        worker.signals.file_started.emit(path, index, len(payloads))
+        temp = upload_name(path, token)
+        with lock:
+            uploaded.append(temp)
+        pool.call(store_file, temp, data, worker, path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = [executor.submit(worker.profiled(upload), index, path, data)
+                       for index, (path, data) in enumerate(payloads, 1)]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                worker.cancel()
+                raise
+        # Все файлы на сервере - подменяем рабочие версии, каждая замена атомарна
+        with pool.connection() as ftp:
+            replace_all(ftp, [path for path, _ in payloads], token, uploaded)
+    except BaseException:
+        remove_uploads(pool, uploaded)
+        raise
+
+def replace_all(ftp, paths, token, uploaded):
+    replaced = []  # (путь, отодвинут ли рабочий файл в резервную копию)
+    try:
+        for path in paths:
+            with TIMINGS.span('rename', path):
+                moved = replace_file(ftp, upload_name(path, token), path, upload_name(path, token, 'backup'))
+            uploaded.remove(upload_name(path, token))
+            replaced.append((path, moved))
+    except ftplib.all_errors as e:
+        # Откатываем уже сделанные замены, чтобы на сервере не остался наполовину обновлённый набор
+        restored, kept = [], []
+        for path, moved in replaced[::-1]:
+            try:
+                if not moved:
+                    raise ftplib.error_perm('нет резервной копии')
+                ftp.delete(path)
+                rename(ftp, upload_name(path, token, 'backup'), path)
+                restored.append(path)
+            except ftplib.all_errors:
+                kept.append(path)
+        message = f'замена не удалась ({e})'
+        if restored:
+            message += '; возвращены прежние версии: ' + ', '.join(p.rsplit('/', 1)[-1] for p in restored[::-1])
+        if kept:
+            message += '; уже заменены новыми: ' + ', '.join(p.rsplit('/', 1)[-1] for p in kept[::-1])
+        raise ftplib.error_perm(message) from e
+    for path, moved in replaced:
+        if moved:
+            try:
+                ftp.delete(upload_name(path, token, 'backup'))
+            except ftplib.error_perm:
+                pass
+
+def remove_uploads(pool, paths):
+    if not paths:
+        return
+    try:
+        with pool.connection() as ftp:
+            for path in paths:
+                try:
+                    ftp.delete(path)
+                except ftplib.error_perm:
+                    # Загрузка могла не успеть создать файл
+                    pass
+    except ftplib.all_errors:
+        pass
+
+def ping_pool(worker, pool):
+    return pool.keepalive()
+
+class ConnectionManager(QObject):
+    """Держит соединения пула живыми по таймеру и переподключается, не перезагружая файлы."""
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = None
+        self.latency = None  # Последняя задержка NOOP в секундах
+        self.error = ''
+        self.check = None
+        self.heartbeat = QTimer(self)
+        self.heartbeat.timeout.connect(self.ping)
+
+    def start(self, pool, interval):
+        self.stop()
+        self.pool = pool
+        self.latency = None
+        self.error = ''
+        self.set_interval(interval)
+        self.changed.emit()
+
+    def stop(self):
+        self.heartbeat.stop()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def set_interval(self, seconds):
+        # 0 - проверка выключена, простаивавшие соединения всё равно проверяются при выдаче из пула
+        if seconds > 0 and self.pool is not None:
+            self.heartbeat.start(seconds * 1000)
+        else:
+            self.heartbeat.stop()
+
+    def ping(self):
+        # Проверка идёт в пуле потоков и не мешает передачам: занятые соединения она не трогает
+        if self.pool is None or self.check is not None:
+            return
+        pool = self.pool
+        self.check = Worker(ping_pool, pool)
+        self.check.signals.finished.connect(lambda result: self.on_ping(pool, result))
+        self.check.signals.failed.connect(lambda message: self.on_ping_failed(pool, message))
+        QThreadPool.globalInstance().start(self.check)
+
+    def on_ping(self, pool, latency):
+        self.check = None
+        if pool is not self.pool:
+            return
+        if latency is not None:
+            self.latency = latency
+        self.error = ''
+        self.changed.emit()
+
+    def on_ping_failed(self, pool, message):
+        self.check = None
+        if pool is not self.pool:
+            return
+        self.latency = None
+        self.error = message
+        self.changed.emit()
+
+    def status_text(self):
+        if self.pool is None:
+            return 'FTP: не подключено'
+        if self.error:
+            return f'FTP: нет связи ({self.error}), переподключений: {self.pool.reconnects}'
+        latency = '-' if self.latency is None else f'{self.latency * 1000:.1f} мс'
+        return f'FTP: задержка {latency}, переподключений: {self.pool.reconnects}'
 
 class FTPConnectionWidget(QWidget):
     def __init__(self, parent=None):
@@ -29,6 +1517,30 @@ class FTPConnectionWidget(QWidget):
         self.user_input = QLineEdit()
         self.password_input = QLineEdit()
         self.password_input.setEchoMode(QLineEdit.Password)
+        self.connections_input = QSpinBox()
+        self.connections_input.setRange(1, len(REMOTE_FILES))
+        self.cache_size_input = QSpinBox()
+        self.cache_size_input.setRange(0, 10000)
+        self.cache_size_input.setSuffix(' МБ')
+        self.cache_size_input.valueChanged.connect(self.update_cache_size)
+        self.clear_cache_btn = QPushButton('Очистить кэш')
+        self.clear_cache_btn.clicked.connect(self.clear_cache)
+        self.compression_input = QCheckBox('Сжимать большие файлы при загрузке (MODE Z или копия .gz)')
+        self.timeout_input = QSpinBox()
+        self.timeout_input.setRange(5, 600)
+        self.timeout_input.setSuffix(' с')
+        self.heartbeat_input = QSpinBox()
+        self.heartbeat_input.setRange(0, 600)
+        self.heartbeat_input.setSuffix(' с')
+        self.heartbeat_input.valueChanged.connect(self.update_heartbeat)
+        self.catalog_input = QLineEdit()
+        self.catalog_input.setPlaceholderText(ITEM_CATALOG_FILE)
+        self.catalog_input.editingFinished.connect(self.update_catalog_path)
+        self.catalog_btn = QPushButton('Обзор...')
+        self.catalog_btn.clicked.connect(self.choose_catalog)
+        catalog_layout = QHBoxLayout()
+        catalog_layout.addWidget(self.catalog_input)
+        catalog_layout.addWidget(self.catalog_btn)
 
         self.connect_btn = QPushButton('Подключиться')
         self.connect_btn.clicked.connect(self.connect_ftp)
@@ -41,34 +1553,74 @@ class FTPConnectionWidget(QWidget):
         form_layout.addRow('Порт:', self.port_input)
         form_layout.addRow('Пользователь:', self.user_input)
         form_layout.addRow('Пароль:', self.password_input)
+        form_layout.addRow('Соединений для загрузки:', self.connections_input)
+        form_layout.addRow('Локальный кэш (0 - выключен):', self.cache_size_input)
+        form_layout.addRow('Таймаут сокета (новые соединения):', self.timeout_input)
+        form_layout.addRow('Проверка связи (0 - выключена):', self.heartbeat_input)
+        form_layout.addRow(self.compression_input)
+        form_layout.addRow('Справочник предметов (GUID - имя):', catalog_layout)
         
         layout.addLayout(form_layout)
         layout.addWidget(self.connect_btn)
         layout.addWidget(self.save_btn)
+        layout.addWidget(self.clear_cache_btn)
         self.setLayout(layout)
 
+    def update_heartbeat(self, value):
+        self.parent.connection.set_interval(value)
+
+    def update_catalog_path(self):
+        self.parent.item_catalog.set_path(self.catalog_input.text().strip())
+
+    def choose_catalog(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Справочник предметов', '', 'Справочник (*.json *.csv *.txt)')
+        if path:
+            self.catalog_input.setText(path)
+            self.update_catalog_path()
+
+    def update_cache_size(self, value):
+        self.parent.file_cache.set_max_bytes(value * 1024 * 1024)
+
+    def clear_cache(self):
+        self.parent.file_cache.clear()
+        QMessageBox.information(self, 'Кэш', 'Локальный кэш очищен.')
+
+    def connection_params(self):
+        return (
+            self.host_input.text(),
+            int(self.port_input.text()),
+            self.user_input.text(),
+            self.password_input.text(),
+            self.timeout_input.value()
+        )
+
     def connect_ftp(self):
         try:
-            self.parent.ftp = ftplib.FTP()
-            self.parent.ftp.connect(
-                self.host_input.text(),
-                int(self.port_input.text())
-            )
-            self.parent.ftp.login(
-                self.user_input.text(),
-                self.password_input.text()
-            )
-            self.parent.ftp.set_pasv(True)
-            QMessageBox.information(self, 'Успех', 'Успешное подключение к FTP!')
-            self.parent.load_configs()
-        except Exception as e:
+            params = self.connection_params()
+        except ValueError as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка подключения: {str(e)}')
+            return
+        if not self.parent.begin_operation('connect'):
+            return
+        self.parent.start_task(open_ftp, *params, on_finished=self.on_connected,
+                               error_message='Ошибка подключения', label='Подключение...')
+
+    def on_connected(self, ftp):
+        self.parent.set_connection(ftp)
+        QMessageBox.information(self, 'Успех', 'Успешное подключение к FTP!')
+        self.parent.load_configs()
 
     def save_settings(self):
         self.settings.setValue('host', self.host_input.text())
         self.settings.setValue('port', self.port_input.text())
         self.settings.setValue('user', self.user_input.text())
         self.settings.setValue('password', self.password_input.text())
+        self.settings.setValue('connections', self.connections_input.value())
+        self.settings.setValue('cache_size', self.cache_size_input.value())
+        self.settings.setValue('compression', self.compression_input.isChecked())
+        self.settings.setValue('timeout', self.timeout_input.value())
+        self.settings.setValue('heartbeat', self.heartbeat_input.value())
+        self.settings.setValue('item_catalog', self.catalog_input.text().strip())
         QMessageBox.information(self, 'Сохранено', 'Настройки подключения сохранены!')
 
     def load_settings(self):
@@ -76,91 +1628,566 @@ class FTPConnectionWidget(QWidget):
         self.port_input.setText(self.settings.value('port', '21'))
         self.user_input.setText(self.settings.value('user', ''))
         self.password_input.setText(self.settings.value('password', ''))
+        self.connections_input.setValue(int(self.settings.value('connections', 3)))
+        self.cache_size_input.setValue(int(self.settings.value('cache_size', 200)))
+        self.compression_input.setChecked(self.settings.value('compression', True, type=bool))
+        self.timeout_input.setValue(int(self.settings.value('timeout', FTP_TIMEOUT)))
+        self.heartbeat_input.setValue(int(self.settings.value('heartbeat', 30)))
+        self.catalog_input.setText(self.settings.value('item_catalog', ''))
+        self.update_catalog_path()
+
+class ConfigValueDelegate(QStyledItemDelegate):
+    """Редактор значения создаётся только на время правки ячейки."""
+    def createEditor(self, parent, option, index):
+        value = index.data(Qt.EditRole)
+        if isinstance(value, int) and not isinstance(value, bool):
+            editor = QSpinBox(parent)
+            editor.setRange(-2147483648, 2147483647)
+            return editor
+        return super().createEditor(parent, option, index)
 
 class ConfigEditor(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(['Параметр', 'Значение'])
+        # Типизированные значения (bool/int/str) хранятся в модели, виджетов на каждый параметр нет
+        self.model = QStandardItemModel(self)
+        self.model.setHorizontalHeaderLabels(['Параметр', 'Значение'])
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setItemDelegateForColumn(1, ConfigValueDelegate(self.tree))
         layout = QVBoxLayout()
         layout.addWidget(self.tree)
         self.setLayout(layout)
 
     def load_config(self, config_text):
-        self.tree.clear()
+        self.model.removeRows(0, self.model.rowCount())
+        sections = []
         current_section = None
         for line in config_text.split('\n'):
             line = line.strip()
             if line.startswith('[') and line.endswith(']'):
-                current_section = QTreeWidgetItem(self.tree, [line[1:-1], ''])
-                current_section.setExpanded(True)
-            elif '=' in line and not line.startswith('#'):
+                current_section = QStandardItem(line[1:-1])
+                current_section.setEditable(False)
+                value_column = QStandardItem()
+                value_column.setEditable(False)
+                sections.append([current_section, value_column])
+            elif '=' in line and not line.startswith('#') and current_section is not None:
                 key, value = line.split('=', 1)
                 key = key.strip()
                 value = value.split('#')[0].strip()
                 
-                item = QTreeWidgetItem(current_section)
-                item.setText(0, key)
-                
+                key_item = QStandardItem(key)
+                key_item.setEditable(False)
+                value_item = QStandardItem()
                 if value.lower() in ('true', 'false'):
-                    checkbox = QCheckBox()
-                    checkbox.setChecked(value.lower() == 'true')
-                    checkbox.stateChanged.connect(lambda state, i=item: self.update_config_value(i, state))
-                    self.tree.setItemWidget(item, 1, checkbox)
+                    value_item.setCheckable(True)
+                    value_item.setEditable(False)
+                    value_item.setCheckState(Qt.Checked if value.lower() == 'true' else Qt.Unchecked)
                 else:
                     try:
                         int_value = int(value)
-                        spinbox = QSpinBox()
-                        spinbox.setMaximum(999999)
-                        spinbox.setValue(int_value)
-                        spinbox.valueChanged.connect(lambda val, i=item: self.update_config_value(i, val))
-                        self.tree.setItemWidget(item, 1, spinbox)
+                        if not -2147483648 <= int_value <= 2147483647:
+                            raise ValueError(value)
+                        value_item.setData(int_value, Qt.EditRole)
                     except ValueError:
-                        line_edit = QLineEdit(value)
-                        line_edit.textChanged.connect(lambda text, i=item: self.update_config_value(i, text))
-                        self.tree.setItemWidget(item, 1, line_edit)
-
-    def update_config_value(self, item, value):
-        # Преобразуем значение в строку в зависимости от типа виджета
-        if isinstance(self.tree.itemWidget(item, 1), QCheckBox):
-            str_value = str(value == Qt.Checked).lower()
-        elif isinstance(self.tree.itemWidget(item, 1), QSpinBox):
-            str_value = str(value)
-        else:
-            str_value = str(value)
+                        value_item.setData(value, Qt.EditRole)
+                current_section.appendRow([key_item, value_item])
         
-        item.setData(1, Qt.UserRole, str_value)
+        # Секции собираются отдельно и добавляются в модель целиком
+        for row in sections:
+            self.model.appendRow(row)
+        self.tree.expandAll()
 
     def get_config(self):
         config = []
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            section = root.child(i)
-            config.append(f'[{section.text(0)}]')
-            for j in range(section.childCount()):
-                item = section.child(j)
-                value = item.data(1, Qt.UserRole)
-                
-                # Проверка на None и установка значения по умолчанию
-                if value is None:
-                    widget = self.tree.itemWidget(item, 1)
-                    if isinstance(widget, QCheckBox):
-                        value = str(widget.isChecked()).lower()
-                    elif isinstance(widget, QSpinBox):
-                        value = str(widget.value())
-                    elif isinstance(widget, QLineEdit):
-                        value = widget.text()
-                    item.setData(1, Qt.UserRole, value)
-                
-                config.append(f'{item.text(0)} = {value}')
+        for i in range(self.model.rowCount()):
+            section = self.model.item(i, 0)
+            config.append(f'[{section.text()}]')
+            for j in range(section.rowCount()):
+                key = section.child(j, 0).text()
+                value_item = section.child(j, 1)
+                if value_item.isCheckable():
+                    value = str(value_item.checkState() == Qt.Checked).lower()
+                else:
+                    value = value_item.data(Qt.EditRole)
+                config.append(f'{key} = {value}')
         return '\n'.join(config)
 
+# Справочник предметов, лежащий рядом с программой; свой файл можно указать в настройках
+ITEM_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prefabs.json')
+GUID_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+class ItemCatalog:
+    """PrefabGUID и имена предметов в отсортированных массивах.
+
+    GUID -> имя и имя -> GUID ищутся делением пополам; совпадения по началу имени идут подряд
+    в отсортированных ключах, по подстроке - одним str.find по склеенным ключам.
+    """
+    def __init__(self, pairs):
+        # Повторы GUID схлопываются, последнее имя побеждает
+        pairs = sorted({guid: name for guid, name in pairs}.items(), key=lambda pair: pair[1].lower())
+        self.names = [name for _, name in pairs]
+        self.keys = [name.lower() for name in self.names]
+        self.name_guids = array('i', [guid for guid, _ in pairs])
+        order = sorted(range(len(pairs)), key=self.name_guids.__getitem__)
+        self.guids = array('i', [self.name_guids[row] for row in order])
+        self.guid_rows = array('i', order)
+        self.text = '\n'.join(self.keys)
+        self.starts = array('i', accumulate((len(key) + 1 for key in self.keys), initial=0))
+
+    def __len__(self):
+        return len(self.names)
+
+    def name(self, guid):
+        index = bisect_left(self.guids, guid)
+        if index < len(self.guids) and self.guids[index] == guid:
+            return self.names[self.guid_rows[index]]
+        return None
+
+    def guid(self, name):
+        key = name.strip().lower()
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.name_guids[index]
+        return None
+
+    def search(self, text, limit=50):
+        """[(guid, имя)]: точный GUID, затем совпадения по началу имени, затем по подстроке."""
+        needle = text.strip().lower()
+        if not needle:
+            return []
+        rows = []
+        try:
+            index = bisect_left(self.guids, int(needle))
+        except ValueError:
+            pass
+        else:
+            if index < len(self.guids) and self.guids[index] == int(needle):
+                rows.append(self.guid_rows[index])
+        index = bisect_left(self.keys, needle)
+        while index < len(self.keys) and len(rows) < limit and self.keys[index].startswith(needle):
+            rows.append(index)
+            index += 1
+        seen = set(rows)
+        position = self.text.find(needle)
+        while position >= 0 and len(rows) < limit:
+            row = bisect_right(self.starts, position) - 1
+            if row not in seen:
+                rows.append(row)
+                seen.add(row)
+            position = self.text.find(needle, self.starts[row + 1])
+        return [(self.name_guids[row], self.names[row]) for row in rows[:limit]]
+
+def parse_guid(value):
+    try:
+        guid = int(str(value).strip())
+    except ValueError:
+        return None
+    return guid if GUID_RANGE[0] <= guid <= GUID_RANGE[1] else None
+
+def load_item_catalog(worker, path):
+    """Читает справочник: JSON {имя: GUID} или {GUID: имя}, JSON-список записей
+    с полями guid/name, либо текст/CSV по строке 'GUID,имя' в любом порядке."""
+    pairs = []
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.items()
+        for entry in data:
+            if isinstance(entry, dict):
+                lowered = {str(key).lower(): value for key, value in entry.items()}
+                entry = (lowered.get('guid', lowered.get('prefabguid')), lowered.get('name'))
+            first, second = entry
+            guid = parse_guid(second)
+            pairs.append((guid, str(first)) if guid is not None else (parse_guid(first), str(second)))
+    else:
+        with open(path, encoding='utf-8-sig') as f:
+            for line in f:
+                fields = re.split(r'\s*[,;\t]\s*', line.strip(), maxsplit=1)
+                if len(fields) < 2:
+                    fields = line.split(None, 1)
+                if len(fields) < 2:
+                    continue
+                guid = parse_guid(fields[0])
+                pairs.append((guid, fields[1].strip()) if guid is not None else (parse_guid(fields[1]), fields[0]))
+    return ItemCatalog((guid, name) for guid, name in pairs if guid is not None and name)
+
+class ItemCatalogSource(QObject):
+    """Справочник предметов для полей PrefabGUID: читается в фоне при первом обращении, а не при запуске."""
+    loaded = pyqtSignal()
+    failed = pyqtSignal(str)
+    RECHECK = 5  # Не чаще раза в столько секунд проверяется, не появился ли и не изменился ли файл
+
+    def __init__(self, path=None, parent=None):
+        super().__init__(parent)
+        self.path = path or ITEM_CATALOG_FILE
+        self.catalog = None
+        self.stamp = None  # (mtime, размер) файла, из которого получен catalog; None - файла не было
+        self.checked = 0
+        self.task = None
+
+    def set_path(self, path):
+        path = path or ITEM_CATALOG_FILE
+        if path != self.path:
+            self.path = path
+            self.catalog = None
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        # Вызывается при каждой отрисовке, поэтому файл проверяется не чаще раза в RECHECK секунд
+        if self.task is not None:
+            return self.catalog
+        now = time.monotonic()
+        if self.catalog is not None and now - self.checked < self.RECHECK:
+            return self.catalog
+        self.checked = now
+        stamp = self.file_stamp()
+        if self.catalog is not None and stamp == self.stamp:
+            return self.catalog
+        if stamp is None:
+            # Файла нет: пустой справочник, пока он не появится
+            self.catalog = ItemCatalog([])
+            self.stamp = None
+            return self.catalog
+        # Пока файл перечитывается, подписи берутся из прежнего справочника
+        self.task = Worker(load_item_catalog, self.path)
+        self.task.signals.finished.connect(
+            lambda catalog, path=self.path, stamp=stamp: self.on_loaded(path, stamp, catalog))
+        self.task.signals.failed.connect(
+            lambda message, path=self.path, stamp=stamp: self.on_failed(path, stamp, message))
+        QThreadPool.globalInstance().start(self.task)
+        return self.catalog
+
+    def on_loaded(self, path, stamp, catalog):
+        self.task = None
+        if path != self.path:
+            # Путь сменили во время чтения - читаем новый файл
+            self.get()
+            return
+        self.catalog = catalog
+        self.stamp = stamp
+        self.loaded.emit()
+
+    def on_failed(self, path, stamp, message):
+        self.task = None
+        if path != self.path:
+            self.get()
+            return
+        # Испорченный файл перечитывается, только когда изменится
+        self.catalog = ItemCatalog([])
+        self.stamp = stamp
+        self.failed.emit(message)
+
+    def name(self, guid):
+        catalog = self.get()
+        guid = parse_guid(guid)
+        return None if catalog is None or guid is None else catalog.name(guid)
+
+    def guid(self, name):
+        catalog = self.get()
+        return None if catalog is None else catalog.guid(name)
+
+    def search(self, text, limit=50):
+        catalog = self.get()
+        return [] if catalog is None else catalog.search(text, limit)
+
+class GuidEdit(QLineEdit):
+    """Поле PrefabGUID: принимает число или имя предмета, подсказки - по началу имени и по подстроке."""
+    SUGGESTION_RE = re.compile(r'\((-?\d+)\)$')
+
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.setPlaceholderText('PrefabGUID или название')
+        # Подсказки подбирает справочник, QCompleter их только показывает
+        self.suggestions = QStringListModel(self)
+        self.completer = QCompleter(self.suggestions, self)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setWidget(self)
+        self.completer.activated[str].connect(self.choose)
+        self.textEdited.connect(self.suggest)
+
+    def suggest(self, text):
+        found = self.catalog.search(text) if parse_guid(text) is None else []
+        self.suggestions.setStringList([f'{name} ({guid})' for guid, name in found])
+        if found:
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    def choose(self, suggestion):
+        match = self.SUGGESTION_RE.search(suggestion)
+        if match:
+            self.setText(match.group(1))
+
+    def value(self):
+        """GUID из поля или по точному имени; None, если ни то ни другое."""
+        guid = parse_guid(self.text())
+        return guid if guid is not None else self.catalog.guid(self.text())
+
+    def setValue(self, guid):
+        self.setText(str(guid))
+
+class GuidDelegate(QStyledItemDelegate):
+    """Столбец PrefabGUID: рядом с числом показывается имя из справочника, правка - в GuidEdit."""
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+
+    def displayText(self, value, locale):
+        name = self.catalog.name(value)
+        return f'{value}  {name}' if name else str(value)
+
+    def createEditor(self, parent, option, index):
+        return GuidEdit(self.catalog, parent)
+
+    def setEditorData(self, editor, index):
+        editor.setText(str(index.data(Qt.EditRole)))
+
+    def setModelData(self, editor, model, index):
+        guid = editor.value()
+        if guid is not None:
+            model.setData(index, guid, Qt.EditRole)
+
+# Допустимые значения столбцов таблицы цен - те же, что в окне добавления товара
+ITEM_LIMITS = {
+    'OutputItem': GUID_RANGE,
+    'OutputAmount': (1, 999999),
+    'InputItem': GUID_RANGE,
+    'InputAmount': (1, 999999),
+    'StockAmount': (0, 999999),
+}
+ITEM_FLAGS = {'true': True, 'false': False, '1': True, '0': False, '1.0': True, '0.0': False,
+              'yes': True, 'no': False, 'да': True, 'нет': False}
+ITEM_KEY = ['OutputItem', 'OutputAmount', 'InputItem']  # Один и тот же лот за одну валюту - повтор
+
+def check_merchant_item(item):
+    """Ошибки товара из merchants.json; пустой список - товар ложится в столбцы модели как есть.
+
+    Товар с ошибками не приводится и не обрезается: модель хранит его исходный словарь.
+    """
+    problems = []
+    for field, (low, high) in ITEM_LIMITS.items():
+        value = item.get(field)
+        if type(value) is not int:
+            problems.append(f'{field}: ожидается целое число ({value!r})')
+        elif not low <= value <= high:
+            problems.append(f'{field}: {value} вне диапазона {low}..{high}')
+    if not isinstance(item.get('Autorefill'), bool):
+        problems.append(f'Autorefill: ожидается true/false ({item.get("Autorefill")!r})')
+    return problems
+
+def validate_merchant_items(frame):
+    """Проверка таблицы товаров одним проходом по столбцам.
+
+    Возвращает (столбцы корректных строк как массивы numpy, ошибки [(строка файла, текст)]);
+    строка 1 файла - заголовок. Без обязательного столбца таблица не принимается целиком.
+    """
+    import numpy as np
+    import pandas as pd
+    names = {str(name).strip().lower(): name for name in frame.columns}
+    missing = [field for field in MerchantItemsModel.FIELDS if field.lower() not in names]
+    if missing:
+        raise ValueError('Нет столбцов: ' + ', '.join(missing))
+    lines = np.arange(len(frame)) + 2
+    problems = []
+    values = {}
+    for field, (low, high) in ITEM_LIMITS.items():
+        raw = frame[names[field.lower()]].fillna('').astype(str).str.strip()
+        number = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        empty = (raw == '').to_numpy()
+        unparsed = np.isnan(number)
+        fraction = ~unparsed & (number != np.round(number))
+        problems.append((empty, f'{field}: пусто'))
+        problems.append((unparsed & ~empty, f'{field}: не число'))
+        problems.append((fraction, f'{field}: не целое'))
+        problems.append((~unparsed & ~fraction & ((number < low) | (number > high)),
+                         f'{field}: вне диапазона {low}..{high}'))
+        values[field] = number
+    flags = frame[names['autorefill']].fillna('').astype(str).str.strip().str.lower().map(ITEM_FLAGS)
+    problems.append((flags.isna().to_numpy(), 'Autorefill: ожидается true/false'))
+    values['Autorefill'] = flags.fillna(False).to_numpy(dtype=bool)
+
+    invalid = np.zeros(len(frame), dtype=bool)
+    for mask, _ in problems:
+        invalid |= mask
+    # Повторы ищем среди корректных строк: первая остаётся, следующие - ошибки со ссылкой на неё
+    rows = np.flatnonzero(~invalid)
+    keys = pd.DataFrame({field: values[field][rows] for field in ITEM_KEY})
+    repeated = keys.duplicated().to_numpy()
+    first = pd.Series(lines[rows]).groupby([keys[field] for field in ITEM_KEY]).transform('first').to_numpy()
+    invalid[rows[repeated]] = True
+
+    errors = [(int(line), text) for mask, text in problems for line in lines[mask]]
+    errors.extend((int(lines[row]), f'повтор строки {int(line)}')
+                  for row, line in zip(rows[repeated], first[repeated]))
+    errors.sort(key=lambda error: error[0])
+    return {field: column[~invalid] for field, column in values.items()}, errors
+
+def read_item_sheet(worker, path):
+    """Читает таблицу цен (CSV или XLSX) и проверяет её; результат - как у validate_merchant_items."""
+    import pandas as pd
+    if path.lower().endswith('.xlsx'):
+        try:
+            frame = pd.read_excel(path, dtype=str, engine='openpyxl')
+        except ImportError:
+            raise ValueError('Для XLSX нужен пакет openpyxl: pip install openpyxl')
+    else:
+        # Разделитель определяется по файлу: Excel с русской локалью сохраняет CSV через ';'
+        frame = pd.read_csv(path, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    return validate_merchant_items(frame)
+
+def write_item_sheet(worker, path, columns):
+    import numpy as np
+    import pandas as pd
+    frame = pd.DataFrame({field: np.frombuffer(column, dtype=column.typecode)
+                          for field, column in zip(MerchantItemsModel.FIELDS, columns)})
+    frame['Autorefill'] = frame['Autorefill'].astype(bool)
+    if path.lower().endswith('.xlsx'):
+        try:
+            frame.to_excel(path, index=False, engine='openpyxl')
+        except ImportError:
+            raise ValueError('Для XLSX нужен пакет openpyxl: pip install openpyxl')
+    else:
+        frame.to_csv(path, index=False)
+    return len(frame)
+
+class MerchantItemsModel(QAbstractTableModel):
+    """Товары одного торговца в типизированных столбцах; вставка и удаление - по одной строке."""
+    FIELDS = ['OutputItem', 'OutputAmount', 'InputItem', 'InputAmount', 'StockAmount', 'Autorefill']
+    HEADERS = ['Товар (ID)', 'Кол-во товара', 'Валюта (ID)', 'Цена', 'Запас', 'Авто-пополнение']
+    TYPECODES = ['i', 'q', 'i', 'q', 'q', 'b']  # PrefabGUID - int32, как в игре
+    CHECK_COLUMN = 5
+
+    def __init__(self, items=(), parent=None):
+        super().__init__(parent)
+        # Некорректные товары файла не попадают в столбцы и не правятся: kept хранит их исходные
+        # словари с числом корректных товаров перед ними, items() ставит их на те же места.
+        # problems [(номер товара, текст)] показывается пользователю
+        self.problems = []
+        self.kept = []
+        rows = []
+        for number, item in enumerate(items, 1):
+            problems = check_merchant_item(item)
+            if problems:
+                self.problems.extend((number, text) for text in problems)
+                self.kept.append([len(rows), item])
+            else:
+                rows.append(item)
+        self.columns = [array(code, [row[field] for row in rows])
+                        for code, field in zip(self.TYPECODES, self.FIELDS)]
+        self.modified = False  # Пока товары не правили, файл сохраняется без изменений
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns[0])
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.FIELDS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        value = self.columns[column][index.row()]
+        if column == self.CHECK_COLUMN:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if value else Qt.Unchecked
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return value
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        column = index.column()
+        if column == self.CHECK_COLUMN:
+            if role != Qt.CheckStateRole:
+                return False
+            value = value == Qt.Checked
+        elif role != Qt.EditRole:
+            return False
+        try:
+            value = int(value)
+        except (TypeError, ValueError, OverflowError):
+            return False
+        low, high = ITEM_LIMITS.get(self.FIELDS[column], (0, 1))
+        if not low <= value <= high:
+            return False
+        self.columns[column][index.row()] = value
+        self.modified = True
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid():
+            flags |= Qt.ItemIsUserCheckable if index.column() == self.CHECK_COLUMN else Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def insert_item(self, row, item):
+        self.beginInsertRows(QModelIndex(), row, row)
+        for column, field in zip(self.columns, self.FIELDS):
+            column.insert(row, item[field])
+        for kept in self.kept:
+            if kept[0] > row:
+                kept[0] += 1
+        self.modified = True
+        self.endInsertRows()
+
+    def remove_item(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        for column in self.columns:
+            column.pop(row)
+        for kept in self.kept:
+            if kept[0] > row:
+                kept[0] -= 1
+        self.modified = True
+        self.endRemoveRows()
+
+    def load_columns(self, columns):
+        """Заменяет все товары столбцами numpy (импорт таблицы цен) без построчных вставок."""
+        self.beginResetModel()
+        self.columns = [array(code, columns[field].astype(code).tobytes())
+                        for code, field in zip(self.TYPECODES, self.FIELDS)]
+        # Импорт заменяет весь список товаров, вместе с некорректными
+        self.kept = []
+        self.modified = True
+        self.endResetModel()
+
+    def items(self):
+        items = [{'OutputItem': output_item, 'OutputAmount': output_amount, 'InputItem': input_item,
+                  'InputAmount': input_amount, 'StockAmount': stock, 'Autorefill': bool(autorefill)}
+                 for output_item, output_amount, input_item, input_amount, stock, autorefill in zip(*self.columns)]
+        for position, item in reversed(self.kept):
+            items.insert(position, item)
+        return items
+
 class ProductsEditor(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, catalog=None):
         super().__init__(parent)
         self.parent = parent
+        self.catalog = catalog or ItemCatalogSource(parent=self)
         self.merchants = []
+        # Модели товаров по торговцам: создаются при первом показе торговца и живут до перезагрузки файла,
+        # поэтому переключение торговцев не перестраивает таблицу
+        self.item_models = []
+        self.current = -1
+        self.sheet_task = None
         self.initUI()
 
     def initUI(self):
@@ -207,13 +2234,14 @@ class ProductsEditor(QWidget):
         merchant_config_layout.addRow(self.merchant_autorepawn)
         
         # Таблица товаров
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            'Товар (ID)', 'Кол-во товара', 
-            'Валюта (ID)', 'Цена', 
-            'Запас', 'Авто-пополнение'
-        ])
+        self.table = QTableView()
+        self.empty_model = MerchantItemsModel(parent=self)
+        self.table.setModel(self.empty_model)
+        # Рядом с GUID товара и валюты - имена из справочника, он догружается при первой отрисовке
+        self.guid_delegate = GuidDelegate(self.catalog, self)
+        self.table.setItemDelegateForColumn(0, self.guid_delegate)
+        self.table.setItemDelegateForColumn(2, self.guid_delegate)
+        self.catalog.loaded.connect(self.table.viewport().update)
         
         # Кнопки управления товарами
         btn_layout = QHBoxLayout()
@@ -222,8 +2250,16 @@ class ProductsEditor(QWidget):
         self.remove_item_btn = QPushButton('Удалить товар')
         self.remove_item_btn.clicked.connect(self.remove_item)
         
+        # Таблица цен целиком: импорт заменяет товары торговца, экспорт сохраняет их как есть
+        self.import_btn = QPushButton('Импорт из CSV/XLSX')
+        self.import_btn.clicked.connect(self.import_items)
+        self.export_btn = QPushButton('Экспорт в CSV/XLSX')
+        self.export_btn.clicked.connect(self.export_items)
+        
         btn_layout.addWidget(self.add_item_btn)
         btn_layout.addWidget(self.remove_item_btn)
+        btn_layout.addWidget(self.import_btn)
+        btn_layout.addWidget(self.export_btn)
         
         layout.addLayout(merchant_layout)
         layout.addLayout(merchant_config_layout)
@@ -233,16 +2269,35 @@ class ProductsEditor(QWidget):
 
     def load_merchants(self, merchants_data):
         self.merchants = merchants_data
+        self.item_models = [None] * len(merchants_data)
+        self.current = -1
+        self.merchant_list.blockSignals(True)
         self.merchant_list.clear()
-        for merchant in merchants_data:
-            self.merchant_list.addItem(merchant['name'])
+        self.merchant_list.addItems([merchant['name'] for merchant in merchants_data])
+        self.merchant_list.blockSignals(False)
         if merchants_data:
             self.load_merchant_items(0)
+        else:
+            self.table.setModel(self.empty_model)
+
+    def item_model(self, index):
+        if self.item_models[index] is None:
+            model = MerchantItemsModel(self.merchants[index]['items'], self)
+            self.item_models[index] = model
+            if model.problems:
+                box = QMessageBox(QMessageBox.Warning, 'Товары торговца',
+                                  f'{self.merchants[index]["name"]}: товаров с ошибками - {len(model.kept)}. '
+                                  'Они не показаны в таблице и сохраняются без изменений.', parent=self)
+                box.setDetailedText('\n'.join(f'Товар {number}: {text}' for number, text in model.problems))
+                box.exec_()
+        return self.item_models[index]
 
     def load_merchant_items(self, index):
         if index < 0 or not self.merchants:
             return
-            
+        # Настройки уходящего торговца сохраняем, его товары и так лежат в его модели
+        self.store_merchant_config()
+        self.current = index
         merchant = self.merchants[index]
         
         # Загружаем настройки торговца
@@ -255,18 +2310,8 @@ class ProductsEditor(QWidget):
         self.merchant_can_move.setChecked(merchant['config']['CanMove'])
         self.merchant_autorepawn.setChecked(merchant['config']['Autorepawn'])
         
-        # Загружаем товары
-        self.table.setRowCount(len(merchant['items']))
-        for row, item in enumerate(merchant['items']):
-            self.table.setItem(row, 0, QTableWidgetItem(str(item['OutputItem'])))
-            self.table.setItem(row, 1, QTableWidgetItem(str(item['OutputAmount'])))
-            self.table.setItem(row, 2, QTableWidgetItem(str(item['InputItem'])))
-            self.table.setItem(row, 3, QTableWidgetItem(str(item['InputAmount'])))
-            self.table.setItem(row, 4, QTableWidgetItem(str(item['StockAmount'])))
-            
-            checkbox = QCheckBox()
-            checkbox.setChecked(item['Autorefill'])
-            self.table.setCellWidget(row, 5, checkbox)
+        # Показываем товары
+        self.table.setModel(self.item_model(index))
 
     def add_merchant(self):
         name, ok = QInputDialog.getText(self, 'Новый торговец', 'Имя торговца:')
@@ -286,6 +2331,7 @@ class ProductsEditor(QWidget):
                 }
             }
             self.merchants.append(new_merchant)
+            self.item_models.append(None)
             self.merchant_list.addItem(name)
             self.merchant_list.setCurrentIndex(len(self.merchants) - 1)
 
@@ -293,111 +2339,453 @@ class ProductsEditor(QWidget):
         current_index = self.merchant_list.currentIndex()
         if current_index >= 0:
             self.merchants.pop(current_index)
+            self.item_models.pop(current_index)
+            # Удалённого торговца уже нет - его настройки при переключении не сохраняем
+            self.current = -1
+            self.merchant_list.blockSignals(True)
             self.merchant_list.removeItem(current_index)
+            self.merchant_list.blockSignals(False)
             if self.merchants:
-                self.load_merchant_items(0)
+                self.load_merchant_items(self.merchant_list.currentIndex())
             else:
-                self.table.setRowCount(0)
+                self.table.setModel(self.empty_model)
 
     def add_item(self):
-        dialog = MerchantItemDialog(self)
+        current_index = self.merchant_list.currentIndex()
+        if current_index < 0:
+            return
+        dialog = MerchantItemDialog(self, self.catalog)
         if dialog.exec_():
-            item = dialog.get_item()
-            current_index = self.merchant_list.currentIndex()
-            if current_index >= 0:
-                self.merchants[current_index]['items'].append(item)
-                self.load_merchant_items(current_index)
+            model = self.item_model(current_index)
+            model.insert_item(model.rowCount(), dialog.get_item())
+            self.table.scrollToBottom()
 
     def remove_item(self):
-        current_row = self.table.currentRow()
+        current_row = self.table.currentIndex().row()
         current_merchant = self.merchant_list.currentIndex()
         if current_row >= 0 and current_merchant >= 0:
-            self.merchants[current_merchant]['items'].pop(current_row)
-            self.load_merchant_items(current_merchant)
+            self.item_model(current_merchant).remove_item(current_row)
 
-    def get_merchants(self):
-        # Сохраняем текущие изменения перед возвратом
+    def start_sheet_task(self, fn, *args, on_finished):
+        # Чтение и запись таблиц идут в пуле потоков: pandas и openpyxl грузятся не мгновенно
+        if self.sheet_task is not None:
+            return
+        self.sheet_task = Worker(fn, *args)
+        self.sheet_task.signals.finished.connect(on_finished)
+        self.sheet_task.signals.failed.connect(self.on_sheet_failed)
+        self.import_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        QThreadPool.globalInstance().start(self.sheet_task)
+
+    def finish_sheet_task(self):
+        self.sheet_task = None
+        self.import_btn.setEnabled(True)
+        self.export_btn.setEnabled(True)
+
+    def on_sheet_failed(self, message):
+        self.finish_sheet_task()
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка таблицы цен: {message}')
+
+    def import_items(self):
         current_index = self.merchant_list.currentIndex()
-        if current_index >= 0:
-            merchant = self.merchants[current_index]
-            merchant['name'] = self.merchant_name.text()
-            merchant['PrefabGUID'] = self.merchant_prefab.value()
-            merchant['config']['x'] = self.merchant_x.value()
-            merchant['config']['z'] = self.merchant_z.value()
-            merchant['config']['IsEnabled'] = self.merchant_enabled.isChecked()
-            merchant['config']['Immortal'] = self.merchant_immortal.isChecked()
-            merchant['config']['CanMove'] = self.merchant_can_move.isChecked()
-            merchant['config']['Autorepawn'] = self.merchant_autorepawn.isChecked()
-            
-            merchant['items'] = []
-            for row in range(self.table.rowCount()):
-                item = {
-                    'OutputItem': int(self.table.item(row, 0).text()),
-                    'OutputAmount': int(self.table.item(row, 1).text()),
-                    'InputItem': int(self.table.item(row, 2).text()),
-                    'InputAmount': int(self.table.item(row, 3).text()),
-                    'StockAmount': int(self.table.item(row, 4).text()),
-                    'Autorefill': self.table.cellWidget(row, 5).isChecked()
-                }
-                merchant['items'].append(item)
-        
+        if current_index < 0:
+            return
+        path, _ = QFileDialog.getOpenFileName(self, 'Импорт товаров', '', 'Таблицы (*.csv *.xlsx)')
+        if not path:
+            return
+        merchant = self.merchants[current_index]
+        self.start_sheet_task(read_item_sheet, path,
+                              on_finished=lambda result: self.on_items_read(merchant, result))
+
+    def on_items_read(self, merchant, result):
+        self.finish_sheet_task()
+        # Пока файл читался, торговца могли удалить
+        index = next((index for index, other in enumerate(self.merchants) if other is merchant), None)
+        if index is None:
+            return
+        columns, errors = result
+        count = len(columns['OutputItem'])
+        if not count and not errors:
+            # Таблица с одними заголовками - скорее всего не тот файл; товары торговца не стираем
+            QMessageBox.warning(self, 'Импорт товаров', 'В таблице нет товаров, список торговца не изменён.')
+            return
+        if errors:
+            box = QMessageBox(QMessageBox.Warning, 'Импорт товаров',
+                              f'Строк с ошибками: {len({line for line, _ in errors})}, корректных: {count}.',
+                              parent=self)
+            box.setDetailedText('\n'.join(f'Строка {line}: {text}' for line, text in errors))
+            if count:
+                box.setInformativeText('Заменить товары торговца корректными строками?')
+                box.setStandardButtons(QMessageBox.Yes | QMessageBox.Cancel)
+            if box.exec_() != QMessageBox.Yes:
+                return
+        self.item_model(index).load_columns(columns)
+        if not errors:
+            QMessageBox.information(self, 'Импорт товаров', f'Загружено товаров: {count}')
+
+    def export_items(self):
+        current_index = self.merchant_list.currentIndex()
+        if current_index < 0:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Экспорт товаров', f'{self.merchant_name.text()}.csv',
+                                              'CSV (*.csv);;Excel (*.xlsx)')
+        if not path:
+            return
+        # Копии столбцов: таблицу можно править, пока файл пишется
+        columns = [array(column.typecode, column) for column in self.item_model(current_index).columns]
+        self.start_sheet_task(write_item_sheet, path, columns, on_finished=self.on_items_written)
+
+    def on_items_written(self, count):
+        self.finish_sheet_task()
+        QMessageBox.information(self, 'Экспорт товаров', f'Сохранено товаров: {count}')
+
+    def store_merchant_config(self):
+        if self.current < 0:
+            return
+        merchant = self.merchants[self.current]
+        merchant['name'] = self.merchant_name.text()
+        merchant['PrefabGUID'] = self.merchant_prefab.value()
+        for key, spin in (('x', self.merchant_x), ('z', self.merchant_z)):
+            # Поле хранит 4 знака - нетронутую координату оставляем с исходной точностью
+            if spin.value() != round(merchant['config'][key], spin.decimals()):
+                merchant['config'][key] = spin.value()
+        merchant['config']['IsEnabled'] = self.merchant_enabled.isChecked()
+        merchant['config']['Immortal'] = self.merchant_immortal.isChecked()
+        merchant['config']['CanMove'] = self.merchant_can_move.isChecked()
+        merchant['config']['Autorepawn'] = self.merchant_autorepawn.isChecked()
+
+    def get_merchants(self):
+        # Сохраняем текущие изменения перед возвратом; товары - дамп моделей торговцев, где их правили
+        self.store_merchant_config()
+        for merchant, model in zip(self.merchants, self.item_models):
+            if model is not None and model.modified:
+                merchant['items'] = model.items()
         return self.merchants
 
-class MerchantItemDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.initUI()
+class MerchantItemDialog(QDialog):
+    def __init__(self, parent=None, catalog=None):
+        super().__init__(parent)
+        self.catalog = catalog or ItemCatalogSource(parent=self)
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle('Добавить товар')
+        layout = QFormLayout()
+        
+        self.output_item = GuidEdit(self.catalog)
+        self.output_amount = QSpinBox()
+        self.output_amount.setRange(1, 999999)
+        self.input_item = GuidEdit(self.catalog)
+        self.input_amount = QSpinBox()
+        self.input_amount.setRange(1, 999999)
+        self.stock_amount = QSpinBox()
+        self.stock_amount.setRange(0, 999999)
+        self.autorefill = QCheckBox('Авто-пополнение')
+        self.autorefill.setChecked(True)
+        
+        layout.addRow('ID товара:', self.guid_row(self.output_item))
+        layout.addRow('Количество товара:', self.output_amount)
+        layout.addRow('ID валюты:', self.guid_row(self.input_item))
+        layout.addRow('Цена:', self.input_amount)
+        layout.addRow('Запас:', self.stock_amount)
+        layout.addRow(self.autorefill)
+        
+        buttons = QHBoxLayout()
+        ok_btn = QPushButton('OK')
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton('Отмена')
+        cancel_btn.clicked.connect(self.reject)
+        
+        buttons.addWidget(ok_btn)
+        buttons.addWidget(cancel_btn)
+        
+        layout.addRow(buttons)
+        self.setLayout(layout)
+
+    def guid_row(self, edit):
+        # Поле GUID и имя предмета, найденное по нему в справочнике
+        name = QLabel()
+        edit.textChanged.connect(lambda text: name.setText(self.catalog.name(edit.value()) or ''))
+        row = QHBoxLayout()
+        row.addWidget(edit)
+        row.addWidget(name)
+        return row
+
+    def accept(self):
+        for edit, title in ((self.output_item, 'товара'), (self.input_item, 'валюты')):
+            if edit.value() is None:
+                QMessageBox.warning(self, 'Ошибка', f'Укажите PrefabGUID {title} числом или названием из справочника.')
+                edit.setFocus()
+                return
+        super().accept()
+
+    def get_item(self):
+        return {
+            'OutputItem': self.output_item.value(),
+            'OutputAmount': self.output_amount.value(),
+            'InputItem': self.input_item.value(),
+            'InputAmount': self.input_amount.value(),
+            'StockAmount': self.stock_amount.value(),
+            'Autorefill': self.autorefill.isChecked()
+        }
+
+TOKEN_THRESHOLDS = [2000, 1000, 500, 100, 1]  # Нижние границы групп кошельков по убыванию
+
+class TokensModel(QAbstractItemModel):
+    """Кошельки игроков на массивах numpy: группы по порогам токенов и игроки внутри групп."""
+    HEADERS = ['Игрок', 'Токены']
+
+    def __init__(self, thresholds=TOKEN_THRESHOLDS, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.tokens = []
+        self.buckets = []
+        self.bounds = []
+        self.matches = None  # Маска найденных игроков, None - поиск не задан
+        self.set_thresholds(thresholds)
+
+    def set_thresholds(self, thresholds):
+        self.beginResetModel()
+        self.thresholds = sorted(set(thresholds), reverse=True)
+        self.labels = [f'{self.thresholds[0]}+']
+        for upper, lower in zip(self.thresholds, self.thresholds[1:]):
+            self.labels.append(f'{lower}-{upper - 1}')
+        self.labels.append('0' if self.thresholds[-1] == 1 else f'<{self.thresholds[-1]}')
+        self.assign_buckets()
+        self.endResetModel()
+
+    def set_data(self, tokens_data):
+        import numpy as np
+        self.beginResetModel()
+        self.names = np.array([entry['CharacterName'] for entry in tokens_data], dtype=str)
+        self.tokens = np.fromiter((entry['Tokens'] for entry in tokens_data), dtype=np.int64,
+                                  count=len(tokens_data))
+        self.matches = None
+        self.assign_buckets()
+        self.endResetModel()
+
+    def assign_buckets(self):
+        # Пустая модель (при создании окна) обходится без numpy
+        if len(self.tokens) == 0:
+            self.bounds = [(0, 0)] * len(self.labels)
+            return
+        import numpy as np
+        # Номер группы для всех игроков одним проходом по столбцу Tokens,
+        # затем игроки упорядочиваются по группе и по убыванию токенов
+        buckets = np.digitize(self.tokens, self.thresholds)
+        order = np.lexsort((-self.tokens, buckets))
+        self.names = self.names[order]
+        self.tokens = self.tokens[order]
+        self.buckets = buckets[order]
+        if self.matches is not None:
+            self.matches = self.matches[order]
+        ends = np.cumsum(np.bincount(self.buckets, minlength=len(self.labels)))
+        self.bounds = list(zip([0] + ends[:-1].tolist(), ends.tolist()))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if len(self.tokens) == 0:
+            return
+        import numpy as np
+        # Сортировка внутри групп, порядок самих групп не меняется
+        if column == 0:
+            key = np.unique(self.names, return_inverse=True)[1]
+        else:
+            key = self.tokens
+        if order == Qt.DescendingOrder:
+            key = -key
+        self.beginResetModel()
+        permutation = np.lexsort((key, self.buckets))
+        self.names = self.names[permutation]
+        self.tokens = self.tokens[permutation]
+        self.buckets = self.buckets[permutation]
+        if self.matches is not None:
+            self.matches = self.matches[permutation]
+        self.endResetModel()
+
+    def set_search(self, text):
+        # Совпадения считаются сразу по всему массиву имён, прокси только читает маску
+        if text and len(self.names):
+            import numpy as np
+            self.matches = np.char.find(np.char.lower(self.names), text.lower()) >= 0
+        else:
+            self.matches = None
+
+    def group_has_matches(self, group):
+        start, end = self.bounds[group]
+        return self.matches is None or bool(self.matches[start:end].any())
+
+    def player_matches(self, group, row):
+        return self.matches is None or bool(self.matches[self.bounds[group][0] + row])
+
+    # index/parent/rowCount вызываются представлением и прокси для каждой строки,
+    # поэтому в них только самые дешёвые проверки
+    def index(self, row, column, parent=QModelIndex()):
+        if row < 0 or column < 0:
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        # internalId игрока - номер его группы плюс один
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index):
+        group = index.internalId()
+        if group == 0:
+            return QModelIndex()
+        return self.createIndex(group - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.labels)
+        if parent.internalId() == 0:
+            start, end = self.bounds[parent.row()]
+            return end - start
+        return 0
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid() or parent.internalId() == 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        group = index.internalId() - 1
+        if group < 0:
+            if role == Qt.DisplayRole and index.column() == 0:
+                start, end = self.bounds[index.row()]
+                label = self.labels[index.row()]
+                return f'{label} ({end - start} игроков)' if end > start else f'{label} токенов'
+            return None
+        row = self.bounds[group][0] + index.row()
+        if role == Qt.DisplayRole:
+            return str(self.names[row]) if index.column() == 0 else int(self.tokens[row])
+        if role == Qt.TextAlignmentRole and index.column() == 1:
+            return Qt.AlignRight
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+class TransactionLogModel(QAbstractTableModel):
+    """Одна страница лога транзакций: строки собираются из столбцов только для показа."""
+    HEADERS = ['От', 'Кому', 'Метод', 'Кем', 'Тип', 'Количество']
+    PAGE_SIZE = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.log = TransactionLog()
+        self.page = 0
+
+    def page_count(self):
+        return max(1, -(-len(self.log) // self.PAGE_SIZE))
+
+    def set_log(self, log):
+        self.beginResetModel()
+        self.log = log
+        self.page = 0
+        self.endResetModel()
+
+    def set_page(self, page):
+        self.beginResetModel()
+        self.page = min(max(page, 0), self.page_count() - 1)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return max(0, min(self.PAGE_SIZE, len(self.log) - self.page * self.PAGE_SIZE))
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = self.page * self.PAGE_SIZE + index.row()
+        if index.column() == 5:
+            return str(self.log.amount(row))
+        name = TransactionLog.TEXT_COLUMNS[index.column()]
+        return self.log.values[self.log.columns[name][row]]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return super().headerData(section, orientation, role)
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return self.page * self.PAGE_SIZE + section + 1
+
+class PlayerFlowsModel(QAbstractTableModel):
+    """Приход и расход токенов по игрокам из лога транзакций; сортировка - argsort по столбцу."""
+    HEADERS = ['Игрок', 'Получено', 'Потрачено', 'Итого']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.values = []  # Массив numpy (игроки x приход, расход, итог)
+
+    def set_flows(self, flows):
+        self.beginResetModel()
+        self.names = flows.index.astype(str).to_numpy()
+        self.values = flows[['inflow', 'outflow', 'net']].to_numpy()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.names[index.row()]
+            value = float(self.values[index.row(), column - 1])
+            return str(int(value) if value.is_integer() else round(value, 2))
+        if role == Qt.TextAlignmentRole and column > 0:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
 
-    def initUI(self):
-        self.setWindowTitle('Добавить товар')
-        layout = QFormLayout()
-        
-        self.output_item = QSpinBox()
-        self.output_item.setRange(-2147483648, 2147483647)
-        self.output_amount = QSpinBox()
-        self.output_amount.setRange(1, 999999)
-        self.input_item = QSpinBox()
-        self.input_item.setRange(-2147483648, 2147483647)
-        self.input_amount = QSpinBox()
-        self.input_amount.setRange(1, 999999)
-        self.stock_amount = QSpinBox()
-        self.stock_amount.setRange(0, 999999)
-        self.autorefill = QCheckBox('Авто-пополнение')
-        self.autorefill.setChecked(True)
-        
-        layout.addRow('ID товара:', self.output_item)
-        layout.addRow('Количество товара:', self.output_amount)
-        layout.addRow('ID валюты:', self.input_item)
-        layout.addRow('Цена:', self.input_amount)
-        layout.addRow('Запас:', self.stock_amount)
-        layout.addRow(self.autorefill)
-        
-        buttons = QHBoxLayout()
-        ok_btn = QPushButton('OK')
-        ok_btn.clicked.connect(self.accept)
-        cancel_btn = QPushButton('Отмена')
-        cancel_btn.clicked.connect(self.reject)
-        
-        buttons.addWidget(ok_btn)
-        buttons.addWidget(cancel_btn)
-        
-        layout.addRow(buttons)
-        self.setLayout(layout)
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
 
-    def get_item(self):
-        return {
-            'OutputItem': self.output_item.value(),
-            'OutputAmount': self.output_amount.value(),
-            'InputItem': self.input_item.value(),
-            'InputAmount': self.input_amount.value(),
-            'StockAmount': self.stock_amount.value(),
-            'Autorefill': self.autorefill.isChecked()
-        }
+    def sort(self, column, order=Qt.AscendingOrder):
+        if len(self.names) == 0:
+            return
+        import numpy as np
+        key = self.names if column == 0 else self.values[:, column - 1]
+        permutation = np.argsort(key, kind='stable')
+        if order == Qt.DescendingOrder:
+            permutation = permutation[::-1]
+        self.layoutAboutToBeChanged.emit()
+        self.names = self.names[permutation]
+        self.values = self.values[permutation]
+        self.layoutChanged.emit()
+
+class TokensFilterProxy(QSortFilterProxyModel):
+    """Скрывает игроков, не попавших в поиск, и группы без найденных игроков."""
+    def set_search(self, text):
+        self.sourceModel().set_search(text)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if not source_parent.isValid():
+            return model.group_has_matches(source_row)
+        return model.player_matches(source_parent.row(), source_row)
 
 class CurrencyTracker(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
+        self.settings = QSettings("V Rising", "Server Manager")
         self.initUI()
 
     def initUI(self):
@@ -425,30 +2813,34 @@ class CurrencyTracker(QWidget):
         
         stats_layout.addLayout(search_layout)
         
-        # Создаем TreeWidget для отображения токенов
-        self.tokens_tree = QTreeWidget()
-        self.tokens_tree.setHeaderLabels(['Игрок', 'Токены'])
+        # Пороги групп настраиваются и сохраняются вместе с остальными настройками
+        thresholds_layout = QHBoxLayout()
+        self.thresholds_input = QLineEdit(self.settings.value(
+            'token_thresholds', ', '.join(map(str, TOKEN_THRESHOLDS))))
+        self.thresholds_input.editingFinished.connect(self.update_thresholds)
+        thresholds_layout.addWidget(QLabel('Пороги групп:'))
+        thresholds_layout.addWidget(self.thresholds_input)
+        stats_layout.addLayout(thresholds_layout)
+        
+        # Дерево токенов: модель на массивах и прокси для поиска
+        self.tokens_model = TokensModel(self.parse_thresholds(self.thresholds_input.text()) or TOKEN_THRESHOLDS, self)
+        self.tokens_proxy = TokensFilterProxy(self)
+        self.tokens_proxy.setSourceModel(self.tokens_model)
+        self.tokens_tree = QTreeView()
+        self.tokens_tree.setModel(self.tokens_proxy)
         self.tokens_tree.setAlternatingRowColors(True)
-        self.tokens_tree.setSortingEnabled(True)
-        self.tokens_tree.setColumnCount(2)
+        self.tokens_tree.setUniformRowHeights(True)
         
         # Настраиваем размеры колонок
         header = self.tokens_tree.header()
         header.setSectionResizeMode(0, QHeaderView.Stretch)
         header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
         
-        # Создаем группы для разных диапазонов токенов
-        self.groups = {
-            '2000+': QTreeWidgetItem(self.tokens_tree, ['2000+ токенов']),
-            '1000-1999': QTreeWidgetItem(self.tokens_tree, ['1000-1999 токенов']),
-            '500-999': QTreeWidgetItem(self.tokens_tree, ['500-999 токенов']),
-            '100-499': QTreeWidgetItem(self.tokens_tree, ['100-499 токенов']),
-            '1-99': QTreeWidgetItem(self.tokens_tree, ['1-99 токенов']),
-            '0': QTreeWidgetItem(self.tokens_tree, ['0 токенов'])
-        }
-        
-        for group in self.groups.values():
-            group.setExpanded(True)
+        # Сортировку по заголовку выполняет модель внутри групп
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(1, Qt.DescendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_tokens)
         
         stats_layout.addWidget(self.tokens_tree)
         stats_tab.setLayout(stats_layout)
@@ -457,90 +2849,184 @@ class CurrencyTracker(QWidget):
         log_tab = QWidget()
         log_layout = QVBoxLayout()
         
-        self.log_table = QTableWidget()
-        self.log_table.setColumnCount(6)
-        self.log_table.setHorizontalHeaderLabels(['От', 'Кому', 'Метод', 'Кем', 'Тип', 'Количество'])
+        self.log_model = TransactionLogModel(self)
+        self.log_table = QTableView()
+        self.log_table.setModel(self.log_model)
         self.log_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         
+        # Переключение страниц лога
+        page_layout = QHBoxLayout()
+        self.prev_page_btn = QPushButton('<')
+        self.prev_page_btn.clicked.connect(lambda: self.show_log_page(self.log_model.page - 1))
+        self.next_page_btn = QPushButton('>')
+        self.next_page_btn.clicked.connect(lambda: self.show_log_page(self.log_model.page + 1))
+        self.page_label = QLabel()
+        page_layout.addWidget(self.prev_page_btn)
+        page_layout.addWidget(self.page_label)
+        page_layout.addWidget(self.next_page_btn)
+        page_layout.addStretch()
+        
         log_layout.addWidget(self.log_table)
+        log_layout.addLayout(page_layout)
         log_tab.setLayout(log_layout)
+        self.show_log_page(0)
+        
+        # Вкладка экономики: графики строятся при первом показе, matplotlib грузится только тогда
+        self.economy_tab = QWidget()
+        self.economy_layout = QVBoxLayout()
+        self.economy_summary = QLabel('Нет данных')
+        self.economy_layout.addWidget(self.economy_summary)
+        # Приход и расход каждого игрока по логу транзакций, под графиками
+        self.flows_model = PlayerFlowsModel(self)
+        self.flows_table = QTableView()
+        self.flows_table.setModel(self.flows_model)
+        self.flows_table.setSortingEnabled(True)
+        self.flows_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.flows_table.horizontalHeader().setSortIndicator(3, Qt.DescendingOrder)
+        self.flows_table.hide()
+        self.economy_layout.addWidget(self.flows_table, 1)
+        self.economy_tab.setLayout(self.economy_layout)
+        self.economy_canvas = None
+        self.economy_key = None
+        self.economy = None
+        self.economy_task = None
         
         # Добавляем вкладки
         tabs.addTab(stats_tab, "Статистика")
         tabs.addTab(log_tab, "Лог")
+        tabs.addTab(self.economy_tab, "Экономика")
+        tabs.currentChanged.connect(self.refresh_economy)
+        self.inner_tabs = tabs
         
         layout.addWidget(tabs)
         self.setLayout(layout)
 
-    def load_data(self, tokens_data, log_data):
-        # Очищаем все группы
-        for group in self.groups.values():
-            group.takeChildren()
+    def refresh_economy(self, *args):
+        if self.inner_tabs.currentWidget() is not self.economy_tab or self.economy_task is not None:
+            return
+        names, tokens, log = self.tokens_model.names, self.tokens_model.tokens, self.log_model.log
+        if len(tokens) == 0 and len(log) == 0:
+            return
+        key = economy_fingerprint(names, tokens, log)
+        if key == self.economy_key:
+            return
+        # Пересчёт в пуле потоков: массивы модели при изменении заменяются, а не правятся на месте
+        self.economy_summary.setText('Расчёт показателей...')
+        self.economy_task = Worker(compute_economy, names, tokens, log)
+        self.economy_task.signals.finished.connect(lambda economy: self.on_economy_ready(key, economy))
+        self.economy_task.signals.failed.connect(self.on_economy_failed)
+        QThreadPool.globalInstance().start(self.economy_task)
+
+    def on_economy_failed(self, message):
+        self.economy_task = None
+        self.economy_summary.setText(f'Ошибка расчёта: {message}')
+
+    def on_economy_ready(self, key, economy):
+        self.economy_task = None
+        self.economy_key = key
+        self.economy = economy
+        self.render_economy()
+        # Данные могли смениться, пока шёл расчёт
+        self.refresh_economy()
+
+    def render_economy(self):
+        import numpy as np
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
         
-        # Сортируем данные по количеству токенов
-        sorted_data = sorted(tokens_data, key=lambda x: x['Tokens'], reverse=True)
+        economy = self.economy
+        self.economy_summary.setText(
+            f'Игроков: {economy["players"]}   Транзакций: {economy["transactions"]}   '
+            f'Всего токенов: {economy["supply"]}   Коэффициент Джини: {economy["gini"]:.3f}'
+        )
+        header = self.flows_table.horizontalHeader()
+        self.flows_model.set_flows(economy['flows'])
+        self.flows_model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+        self.flows_table.show()
+        if self.economy_canvas is None:
+            self.economy_canvas = FigureCanvas(Figure(figsize=(8, 6), tight_layout=True))
+            # Графики над таблицей игроков
+            self.economy_layout.insertWidget(1, self.economy_canvas, 2)
+        figure = self.economy_canvas.figure
+        figure.clear()
+        lorenz, earners, methods, types = figure.subplots(2, 2).flat
         
-        # Распределяем игроков по группам
-        for entry in sorted_data:
-            tokens = entry['Tokens']
-            player = entry['CharacterName']
-            
-            if tokens >= 2000:
-                group = self.groups['2000+']
-            elif tokens >= 1000:
-                group = self.groups['1000-1999']
-            elif tokens >= 500:
-                group = self.groups['500-999']
-            elif tokens >= 100:
-                group = self.groups['100-499']
-            elif tokens > 0:
-                group = self.groups['1-99']
-            else:
-                group = self.groups['0']
-            
-            item = QTreeWidgetItem(group, [player, str(tokens)])
-            item.setTextAlignment(1, Qt.AlignRight)
+        # Кривая Лоренца распределения токенов
+        balances = economy['balances']
+        if len(balances) and balances.sum() > 0:
+            share = np.concatenate([[0], np.cumsum(balances) / balances.sum()])
+            lorenz.plot(np.linspace(0, 1, len(share)), share)
+        lorenz.plot([0, 1], [0, 1], linestyle='--', color='gray')
+        lorenz.set_title(f'Распределение токенов (Джини {economy["gini"]:.3f})')
         
-        # Обновляем заголовки групп с количеством игроков
-        for group_name, group in self.groups.items():
-            count = group.childCount()
-            if count > 0:
-                group.setText(0, f'{group_name} ({count} игроков)')
+        top = economy['top_earners'][::-1]
+        earners.barh(top.index.astype(str), top.to_numpy())
+        earners.set_title('Больше всех получили')
         
-        # Загрузка лога
-        self.log_table.setRowCount(len(log_data))
-        for i, entry in enumerate(log_data):
-            self.log_table.setItem(i, 0, QTableWidgetItem(entry['From']))
-            self.log_table.setItem(i, 1, QTableWidgetItem(entry['To']))
-            self.log_table.setItem(i, 2, QTableWidgetItem(entry['Method']))
-            self.log_table.setItem(i, 3, QTableWidgetItem(entry['By']))
-            self.log_table.setItem(i, 4, QTableWidgetItem(entry['Type']))
-            self.log_table.setItem(i, 5, QTableWidgetItem(str(entry['Amount'])))
+        methods.bar(economy['by_method'].index.astype(str), economy['by_method']['sum'].to_numpy())
+        methods.set_title('Сумма по методам')
+        methods.tick_params(axis='x', labelrotation=45)
+        
+        types.bar(economy['by_type'].index.astype(str), economy['by_type']['sum'].to_numpy())
+        types.set_title('Сумма по типам')
+        types.tick_params(axis='x', labelrotation=45)
+        self.economy_canvas.draw_idle()
 
-    def search_player(self):
-        search_text = self.search_input.text().lower()
-        
-        # Показываем все группы при пустом поиске
-        if not search_text:
-            for group in self.groups.values():
-                group.setHidden(False)
-                for i in range(group.childCount()):
-                    group.child(i).setHidden(False)
+    def parse_thresholds(self, text):
+        try:
+            return [int(value) for value in text.replace(';', ',').split(',') if value.strip()]
+        except ValueError:
+            return []
+
+    def update_thresholds(self):
+        thresholds = self.parse_thresholds(self.thresholds_input.text())
+        if not thresholds:
+            QMessageBox.warning(self, 'Ошибка', 'Пороги групп - целые числа через запятую.')
             return
+        self.settings.setValue('token_thresholds', ', '.join(map(str, thresholds)))
+        self.tokens_model.set_thresholds(thresholds)
+        self.apply_sort()
+
+    def expand_groups(self):
+        # Раскрываем только группы верхнего уровня: expandAll обходит всех игроков
+        for row in range(self.tokens_proxy.rowCount()):
+            self.tokens_tree.expand(self.tokens_proxy.index(row, 0))
+
+    def sort_tokens(self, column, order):
+        self.tokens_model.sort(column, order)
+        self.expand_groups()
+
+    def apply_sort(self):
+        # После перегруппировки игроки упорядочены по убыванию токенов - восстанавливаем выбранную сортировку
+        header = self.tokens_tree.header()
+        if header.sortIndicatorSection() != 1 or header.sortIndicatorOrder() != Qt.DescendingOrder:
+            self.tokens_model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+        self.expand_groups()
+
+    def load_data(self, tokens_data, log_data):
+        self.tokens_model.set_data(tokens_data)
+        self.apply_sort()
+        if self.search_input.text():
+            self.search_player()
         
-        # Проходим по всем группам и их элементам
-        for group in self.groups.values():
-            has_visible_children = False
-            for i in range(group.childCount()):
-                child = group.child(i)
-                player_name = child.text(0).lower()
-                # Показываем элемент, если имя содержит поисковый текст
-                matches = search_text in player_name
-                child.setHidden(not matches)
-                has_visible_children = has_visible_children or matches
-            
-            # Показываем группу только если в ней есть видимые элементы
-            group.setHidden(not has_visible_children)
+        # Загрузка лога
+        if not isinstance(log_data, TransactionLog):
+            log_data = TransactionLog.from_records(log_data)
+        self.log_model.set_log(log_data)
+        self.show_log_page(0)
+        self.refresh_economy()
+
+    def show_log_page(self, page):
+        self.log_model.set_page(page)
+        self.page_label.setText(f'Страница {self.log_model.page + 1} из {self.log_model.page_count()} '
+                                f'({len(self.log_model.log)} записей)')
+        self.prev_page_btn.setEnabled(self.log_model.page > 0)
+        self.next_page_btn.setEnabled(self.log_model.page < self.log_model.page_count() - 1)
+
+    def search_player(self):
+        # Фильтрует прокси, отдельные строки дерева не трогаются
+        self.tokens_proxy.set_search(self.search_input.text())
+        self.expand_groups()
 
     def clear_search(self):
         self.search_input.clear()
@@ -656,19 +3142,134 @@ class AnnouncementDialog(QDialog):
             'OneTime': self.one_time_checkbox.isChecked()
         }
 
+class ChatLogModel(QAbstractTableModel):
+    """Модель записей чат лога: ячейки отдаются по запросу, без виджета на каждую.
+
+    rows - номера показываемых записей по возрастанию, None - показываются все.
+    """
+    HEADERS = ['Время', 'Тип', 'Отправитель', 'Сообщение']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        self.rows = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.entries) if self.rows is None else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            row = index.row() if self.rows is None else self.rows[index.row()]
+            return str(self.entries[row][index.column()])
+        if role == Qt.TextAlignmentRole:
+            if index.column() == 3:  # Столбец с сообщением
+                return Qt.AlignLeft | Qt.AlignTop
+            return Qt.AlignLeft | Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def set_entries(self, entries, rows=None):
+        self.beginResetModel()
+        self.entries = entries
+        self.rows = rows
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        # Сброс затрагивает только список номеров, сами записи не копируются
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def append_entries(self, entries, rows=None):
+        # rows - номера видимых среди дописанных записей (при фильтрации)
+        first = self.rowCount()
+        added = len(entries) if self.rows is None else len(rows)
+        if not added:
+            self.entries.extend(entries)
+            return
+        self.beginInsertRows(QModelIndex(), first, first + added - 1)
+        self.entries.extend(entries)
+        if self.rows is not None:
+            self.rows.extend(rows)
+        self.endInsertRows()
+
 class ChatLogViewer(QWidget):
+    # Пакетный разбор через parse_log_lines; False - построчный parse_log_line для сравнения
+    use_batch_parser = True
+    ARCHIVE_PAGE_SIZE = 1000  # Записей архива на странице
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
+        self.all_entries = []
+        self.index = ChatIndex()
+        # Архив истории (ChatArchive) и сервер, к которому относятся записи; задаются главным окном
+        self.archive = None
+        self.archive_server = None
+        self.archive_page = 0
+        # Номера записей, найденных поиском (по возрастанию), None - поиск не задан
+        self.matches = None
         self.initUI()
 
     def initUI(self):
         layout = QVBoxLayout()
         
-        # Создаем таблицу для лога
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(['Время', 'Тип', 'Отправитель', 'Сообщение'])
+        # Поиск по обратному индексу: слова, "фраза", from:Игрок
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Поиск: слова, "фраза", from:Игрок')
+        self.search_input.returnPressed.connect(self.search)
+        self.search_btn = QPushButton('Найти')
+        self.search_btn.clicked.connect(self.search)
+        self.clear_search_btn = QPushButton('Сбросить')
+        self.clear_search_btn.clicked.connect(self.clear_search)
+        self.search_status = QLabel()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_btn)
+        search_layout.addWidget(self.clear_search_btn)
+        search_layout.addWidget(self.search_status)
+        
+        # Просмотр архива: в памяти держится только текущая страница
+        archive_layout = QHBoxLayout()
+        self.archive_mode = QCheckBox('История из архива')
+        self.archive_mode.toggled.connect(self.toggle_archive)
+        self.since_input = QDateEdit(QDate.currentDate().addDays(-7))
+        self.until_input = QDateEdit(QDate.currentDate())
+        for date_input in (self.since_input, self.until_input):
+            date_input.setCalendarPopup(True)
+            date_input.dateChanged.connect(self.reload_archive)
+        self.archive_prev_btn = QPushButton('<')
+        self.archive_prev_btn.clicked.connect(lambda: self.show_archive_page(self.archive_page - 1))
+        self.archive_next_btn = QPushButton('>')
+        self.archive_next_btn.clicked.connect(lambda: self.show_archive_page(self.archive_page + 1))
+        self.archive_page_label = QLabel()
+        archive_layout.addWidget(self.archive_mode)
+        archive_layout.addWidget(QLabel('С:'))
+        archive_layout.addWidget(self.since_input)
+        archive_layout.addWidget(QLabel('По:'))
+        archive_layout.addWidget(self.until_input)
+        archive_layout.addWidget(self.archive_prev_btn)
+        archive_layout.addWidget(self.archive_page_label)
+        archive_layout.addWidget(self.archive_next_btn)
+        archive_layout.addStretch()
+        
+        # Создаем таблицу для лога: модель со всеми записями, фильтры задают список видимых номеров
+        self.model = ChatLogModel(self)
+        self.model.set_entries(self.all_entries)
+        self.archive_model = ChatLogModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         
         # Настраиваем заголовки и размеры столбцов
         header = self.table.horizontalHeader()
@@ -685,8 +3286,9 @@ class ChatLogViewer(QWidget):
         # Включаем перенос текста
         self.table.setWordWrap(True)
         
-        # Автоматическая высота строк
-        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        # Одинаковая высота строк: подгонка под содержимое требует обхода всех строк,
+        # полный текст длинного сообщения доступен во всплывающей подсказке
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         
         # Создаем чекбоксы для фильтрации
         filter_layout = QHBoxLayout()
@@ -705,14 +3307,23 @@ class ChatLogViewer(QWidget):
             checkbox.stateChanged.connect(self.apply_filters)
             filter_layout.addWidget(checkbox)
         
+        # Режим докачки: при обновлении загружаются только новые строки
+        self.tail_mode = QCheckBox('Только новые строки')
+        self.tail_mode.setChecked(True)
+        filter_layout.addWidget(self.tail_mode)
+        
         # Кнопка обновления
         self.refresh_btn = QPushButton('Обновить')
         self.refresh_btn.clicked.connect(self.refresh_log)
         filter_layout.addWidget(self.refresh_btn)
         
+        layout.addLayout(search_layout)
+        layout.addLayout(archive_layout)
         layout.addLayout(filter_layout)
         layout.addWidget(self.table)
         self.setLayout(layout)
+        self.apply_filters()
+        self.toggle_archive(False)
 
     def parse_log_line(self, line):
         try:
@@ -770,40 +3381,136 @@ class ChatLogViewer(QWidget):
             pass
         return None
 
+    def parse_lines(self, lines, numbered=False):
+        # Не трогает виджеты, поэтому может вызываться из рабочего потока
+        if self.use_batch_parser:
+            return list(parse_log_lines(lines, numbered))
+        if numbered:
+            return [(number, parsed) for number, parsed in enumerate(map(self.parse_log_line, lines)) if parsed]
+        return [parsed for parsed in map(self.parse_log_line, lines) if parsed]
+
     def load_log(self, log_text):
+        self.load_entries(self.parse_lines(log_text.split('\n')))
+
+    def append_log(self, log_text):
+        self.append_entries(self.parse_lines(log_text.split('\n')))
+
+    def load_entries(self, entries):
         self.all_entries = []
-        for line in log_text.split('\n'):
-            parsed = self.parse_log_line(line)
-            if parsed:
-                self.all_entries.append(parsed)
-        self.apply_filters()
+        self.index.clear()
+        self.model.set_entries(self.all_entries, self.visible_rows())
+        self.append_entries(entries)
+
+    def append_entries(self, entries):
+        # Индекс и совпадения обновляются до вставки, видимыми становятся только подходящие новые строки
+        first = len(self.all_entries)
+        self.index.add(entries)
+        if self.matches is not None:
+            self.matches = self.index.search(self.search_input.text())
+        if self.model.rows is None:
+            self.model.append_entries(entries)
+        else:
+            self.model.append_entries(entries, self.visible_rows(first))
+
+    def visible_rows(self, first=0):
+        """Номера записей начиная с first для включённых каналов и поиска, None - видны все."""
+        channels = self.channels()
+        if self.matches is None and len(channels) == len(self.filters):
+            return None
+        postings = [self.index.channels[channel] for channel in channels if channel in self.index.channels]
+        if not postings:
+            return []
+        import numpy as np
+        postings = [np.frombuffer(posting, dtype=np.int32) for posting in postings]
+        # Слияние отсортированных списков позиций: устойчивая сортировка склеенных серий
+        rows = np.concatenate([posting[np.searchsorted(posting, first):] for posting in postings])
+        rows = np.sort(rows, kind='stable')
+        if self.matches is not None:
+            rows = rows[np.isin(rows, np.asarray(self.matches, dtype=np.int32), assume_unique=True)]
+        return rows.tolist()
+
+    def search(self):
+        if self.archive_mode.isChecked():
+            self.reload_archive()
+            return
+        query = self.search_input.text()
+        started = time.perf_counter()
+        matches = self.index.search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.matches = matches
+        self.model.set_rows(self.visible_rows())
+        if matches is None:
+            self.search_status.clear()
+        else:
+            self.search_status.setText(f'Найдено: {len(matches)} ({elapsed:.1f} мс)')
+
+    def clear_search(self):
+        self.search_input.clear()
+        self.search()
+
+    def channels(self):
+        return [name for name, checkbox in self.filters.items() if checkbox.isChecked()]
 
     def apply_filters(self):
-        self.table.setRowCount(0)
-        row = 0
-        for entry in self.all_entries:
-            if entry[1] in self.filters and self.filters[entry[1]].isChecked():
-                self.table.insertRow(row)
-                for col, value in enumerate(entry):
-                    item = QTableWidgetItem(str(value))
-                    if col == 3:  # Столбец с сообщением
-                        item.setTextAlignment(Qt.AlignLeft | Qt.AlignTop)
-                    else:
-                        item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-                    self.table.setItem(row, col, item)
-                row += 1
-        
-        # Обновляем высоту строк после добавления данных
-        self.table.resizeRowsToContents()
+        self.model.set_rows(self.visible_rows())
+        self.reload_archive()
+
+    def toggle_archive(self, enabled):
+        for widget in (self.since_input, self.until_input, self.archive_prev_btn,
+                       self.archive_next_btn, self.archive_page_label):
+            widget.setEnabled(enabled)
+        self.tail_mode.setEnabled(not enabled)
+        self.refresh_btn.setEnabled(not enabled)
+        self.table.setModel(self.archive_model if enabled else self.model)
+        self.search_status.clear()
+        if enabled:
+            self.show_archive_page(0)
+        else:
+            self.archive_model.set_entries([])
+            self.search()
+
+    def reload_archive(self):
+        if self.archive_mode.isChecked():
+            self.show_archive_page(0)
+
+    def show_archive_page(self, page):
+        if self.archive is None or self.archive_server is None:
+            self.archive_model.set_entries([])
+            self.archive_page_label.setText('Архив пуст')
+            return
+        page = max(0, page)
+        # Запрос разбирается так же, как в индексе: from:Игрок и слова/фразы как подстроки
+        sender = None
+        words = []
+        for match in CHAT_QUERY_RE.finditer(self.search_input.text()):
+            if match.group('sender') or match.group('quoted_sender'):
+                sender = match.group('sender') or match.group('quoted_sender')
+            elif match.group('phrase') or match.group('term'):
+                words.append(match.group('phrase') or match.group('term'))
+        # Берём на одну запись больше страницы, чтобы узнать о следующей без COUNT(*)
+        rows = self.archive.query(self.archive_server, self.channels(), sender, words,
+                                  self.since_input.date().toString(Qt.ISODate),
+                                  self.until_input.date().toString(Qt.ISODate),
+                                  limit=self.ARCHIVE_PAGE_SIZE + 1,
+                                  offset=page * self.ARCHIVE_PAGE_SIZE)
+        has_next = len(rows) > self.ARCHIVE_PAGE_SIZE
+        self.archive_page = page
+        self.archive_model.set_entries([(f'{day} {timestamp}', channel, sender, message)
+                                        for timestamp, channel, sender, message, day
+                                        in rows[:self.ARCHIVE_PAGE_SIZE]])
+        self.archive_page_label.setText(f'Страница {page + 1}')
+        self.archive_prev_btn.setEnabled(page > 0)
+        self.archive_next_btn.setEnabled(has_next)
 
     def refresh_log(self):
         if self.parent and hasattr(self.parent, 'load_chat_log'):
             self.parent.load_chat_log()
 
 class BossEditor(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, catalog=None):
         super().__init__(parent)
         self.parent = parent
+        self.catalog = catalog or ItemCatalogSource(parent=self)
         self.bosses = []
         self.initUI()
 
@@ -876,6 +3583,9 @@ class BossEditor(QWidget):
         self.items_table.setHorizontalHeaderLabels(['Название', 'ID предмета', 'Количество', 'Шанс', 'Цвет'])
         header = self.items_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
+        self.guid_delegate = GuidDelegate(self.catalog, self)
+        self.items_table.setItemDelegateForColumn(1, self.guid_delegate)
+        self.catalog.loaded.connect(self.items_table.viewport().update)
         
         # Кнопки управления предметами
         items_btn_layout = QHBoxLayout()
@@ -1173,10 +3883,189 @@ class RaidEditor(QWidget):
         
         return '\n'.join(config)
 
+class TimingsModel(QAbstractTableModel):
+    """Замеры этапов в порядке поступления; хранит не больше StageTimings.LIMIT строк."""
+    HEADERS = ['Операция', 'Файл', 'Этап', 'мс', 'Байт', 'МБ/с', 'Поток']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+
+    def set_records(self, records):
+        self.beginResetModel()
+        self.records = records[-StageTimings.LIMIT:]
+        self.endResetModel()
+
+    def append_records(self, records):
+        if len(self.records) + len(records) > StageTimings.LIMIT:
+            self.set_records(self.records + records)
+            return
+        self.beginInsertRows(QModelIndex(), len(self.records), len(self.records) + len(records) - 1)
+        self.records.extend(records)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        column = index.column()
+        if role == Qt.TextAlignmentRole and 3 <= column <= 5:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role == Qt.ToolTipRole and 'error' in record:
+            return f'Прервано: {record["error"]}'
+        if role != Qt.DisplayRole:
+            return None
+        if column == 0:
+            return f'{record["operation"]} #{record["run"]}'
+        if column == 1:
+            return (record['file'] or '').rsplit('/', 1)[-1]
+        if column == 2:
+            return record['stage'] + (' !' if 'error' in record else '')
+        if column == 3:
+            return f'{record["seconds"] * 1000:.1f}'
+        size = record.get('bytes')
+        if column == 4:
+            return '' if size is None else str(size)
+        if column == 5:
+            if not size or record['seconds'] <= 0:
+                return ''
+            return f'{size / record["seconds"] / 1e6:.1f}'
+        return record['thread']
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+class DiagnosticsPanel(QWidget):
+    """Вкладка диагностики: замеры этапов загрузки и сохранения, итоги последней операции и выгрузка в JSON lines."""
+    REFRESH_INTERVAL = 1000  # мс, пока вкладка открыта
+
+    def __init__(self):
+        super().__init__()
+        self.seen = 0
+        self.initUI()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def initUI(self):
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.model = TimingsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.export_btn = QPushButton('Экспорт в JSON lines')
+        self.export_btn.clicked.connect(self.export)
+        self.clear_btn = QPushButton('Очистить')
+        self.clear_btn.clicked.connect(self.clear)
+        buttons.addWidget(self.export_btn)
+        buttons.addWidget(self.clear_btn)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+
+    def refresh(self):
+        records, self.seen, dropped = TIMINGS.since(self.seen)
+        if dropped:
+            self.model.set_records(records)
+        elif records:
+            at_bottom = self.table.verticalScrollBar().value() == self.table.verticalScrollBar().maximum()
+            self.model.append_records(records)
+            if at_bottom:
+                self.table.scrollToBottom()
+        if records or dropped:
+            self.summary_label.setText(self.summary())
+
+    def summary(self):
+        # Итоги последней операции по этапам: сумма времени (этапы разных файлов идут параллельно) и объём
+        if not self.model.records:
+            return ''
+        last = self.model.records[-1]
+        run = (last['operation'], last['run'])
+        stages = {}
+        for record in self.model.records:
+            if (record['operation'], record['run']) != run:
+                continue
+            seconds, size, count = stages.get(record['stage'], (0.0, 0, 0))
+            stages[record['stage']] = (seconds + record['seconds'], size + (record.get('bytes') or 0), count + 1)
+        parts = []
+        for stage, (seconds, size, count) in stages.items():
+            part = f'{stage}: {seconds * 1000:.0f} мс ({count})'
+            if size:
+                part += f', {size / 1e6:.1f} МБ'
+            parts.append(part)
+        return f'{run[0]} #{run[1]} - ' + '; '.join(parts)
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Экспорт замеров', 'timings.jsonl', 'JSON lines (*.jsonl)')
+        if not path:
+            return
+        self.refresh()
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for record in self.model.records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка экспорта: {str(e)}')
+
+    def clear(self):
+        TIMINGS.clear()
+        self.seen = 0
+        self.model.set_records([])
+        self.summary_label.clear()
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.ftp = None
+        self.ftp_pool = None
+        self.connection = ConnectionManager(self)
+        self.task = None
+        self.task_handler = None
+        self.task_error_message = ''
+        self.currency_data = {}
+        self.transfers = {}
+        self.loaded_hashes = {}  # Хэш содержимого каждого файла в том виде, в каком он загружен
+        self.pending_save = {}
+        self.skipped_save = []
+        self.raw_files = {}  # Скачанные, но ещё не разобранные файлы по ключам
+        self.parse_tasks = {}
+        self.file_runs = {}  # Операция, которой скачан каждый файл, - к ней относятся замеры его разбора
+        self.profile = None
+        self.opened_tabs = set()
+        cache_root = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation),
+                                  'V Rising Server Manager')
+        self.file_cache = FileCache(cache_root, 0)
+        self.chat_log_tail = LogTail(REMOTE_PATHS['chat_log'])
+        data_root = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation),
+                                 'V Rising Server Manager')
+        self.chat_archive = ChatArchive(os.path.join(data_root, 'chat_archive.sqlite3'))
+        self.item_catalog = ItemCatalogSource(parent=self)
+        self.item_catalog.failed.connect(
+            lambda message: self.statusBar().showMessage(f'Справочник предметов не загружен: {message}', 15000))
         self.initUI()
 
     def initUI(self):
@@ -1187,12 +4076,14 @@ class MainWindow(QMainWindow):
         
         self.ftp_connection = FTPConnectionWidget(self)
         self.config_editor = ConfigEditor()
-        self.products_editor = ProductsEditor()
+        self.products_editor = ProductsEditor(catalog=self.item_catalog)
         self.currency_tracker = CurrencyTracker()
         self.announcement_editor = AnnouncementEditor()
         self.chat_log_viewer = ChatLogViewer(self)
-        self.boss_editor = BossEditor()
+        self.chat_log_viewer.archive = self.chat_archive
+        self.boss_editor = BossEditor(catalog=self.item_catalog)
         self.raid_editor = RaidEditor()
+        self.diagnostics = DiagnosticsPanel()
         
         self.tabs.addTab(self.ftp_connection, 'FTP подключение')
         self.tabs.addTab(self.config_editor, 'Настройки')
@@ -1202,145 +4093,563 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.chat_log_viewer, 'Чат лог')
         self.tabs.addTab(self.boss_editor, 'Редактор боссов')
         self.tabs.addTab(self.raid_editor, 'Настройки рейдов')
+        self.tabs.addTab(self.diagnostics, 'Диагностика')
+        
+        # Файлы каждой вкладки разбираются и показываются только при её первом открытии
+        self.tab_files = {
+            self.config_editor: ['config'],
+            self.products_editor: ['merchants'],
+            self.currency_tracker: ['tokens', 'log'],
+            self.announcement_editor: ['announcements'],
+            self.chat_log_viewer: ['chat_log'],
+            self.boss_editor: ['bosses'],
+            self.raid_editor: ['raid_forge', 'raid_guard'],
+        }
+        self.file_tabs = {key: tab for tab, keys in self.tab_files.items() for key in keys}
+        self.tabs.currentChanged.connect(self.on_tab_changed)
         
         self.save_btn = QPushButton('Сохранить все изменения', self)
         self.save_btn.clicked.connect(self.save_all)
         
+        # Ход фоновой операции: текущий файл, прогресс передачи и отмена
+        task_layout = QHBoxLayout()
+        self.task_label = QLabel()
+        self.task_progress = QProgressBar()
+        self.cancel_btn = QPushButton('Отмена')
+        self.cancel_btn.clicked.connect(self.cancel_task)
+        task_layout.addWidget(self.task_label)
+        task_layout.addWidget(self.task_progress)
+        task_layout.addWidget(self.cancel_btn)
+        self.set_task_visible(False)
+        
         main_layout = QVBoxLayout()
         main_layout.addWidget(self.tabs)
+        main_layout.addLayout(task_layout)
         main_layout.addWidget(self.save_btn)
         
         container = QWidget()
         container.setLayout(main_layout)
         self.setCentralWidget(container)
+        
+        # Состояние соединения: задержка последней проверки и число переподключений
+        self.connection_label = QLabel()
+        self.statusBar().addPermanentWidget(self.connection_label)
+        self.connection.changed.connect(self.update_connection_status)
+        self.update_connection_status()
+
+    def set_connection(self, ftp):
+        # Основное соединение становится первым в пуле, остальные откроются при загрузке;
+        # дальше пул живёт под присмотром менеджера соединения и переподключается сам
+        self.ftp_pool = FTPPool(self.ftp_connection.connection_params(),
+                                self.ftp_connection.connections_input.value(), ftp)
+        self.connection.start(self.ftp_pool, self.ftp_connection.heartbeat_input.value())
+        self.chat_log_viewer.archive_server = '%s:%s' % self.ftp_pool.params[:2]
+
+    def update_connection_status(self):
+        self.connection_label.setText(self.connection.status_text())
+
+    def set_task_visible(self, visible):
+        self.task_label.setVisible(visible)
+        self.task_progress.setVisible(visible)
+        self.cancel_btn.setVisible(visible)
+
+    def begin_operation(self, operation):
+        # Замеры дальше относятся к этой операции; cProfile снимается, если её имя задано в VRSM_PROFILE
+        if self.task is not None:
+            QMessageBox.warning(self, 'Подождите', 'Дождитесь завершения текущей операции.')
+            return False
+        TIMINGS.begin(operation)
+        self.profile = OperationProfile(operation) if os.environ.get(PROFILE_ENV) == operation else None
+        return True
+
+    def dump_profile(self):
+        if self.profile is None:
+            return
+        path = self.profile.dump()
+        self.profile = None
+        if path is not None:
+            print(f'Профиль сохранён: {path}', file=sys.stderr)
+            self.statusBar().showMessage(f'Профиль сохранён: {path}', 15000)
+
+    def start_task(self, fn, *args, on_finished=None, error_message='Ошибка', label='Выполняется...'):
+        # Сетевые операции выполняются по одной: ftplib не допускает параллельных команд
+        if self.task is not None:
+            QMessageBox.warning(self, 'Подождите', 'Дождитесь завершения текущей операции.')
+            return
+        worker = Worker(fn, *args)
+        worker.profile = self.profile
+        worker.signals.file_started.connect(self.on_file_started)
+        worker.signals.progress.connect(self.on_transfer_progress)
+        worker.signals.compressed.connect(self.on_transfer_compressed)
+        worker.signals.result.connect(self.on_file_fetched)
+        worker.signals.finished.connect(self.on_task_finished)
+        worker.signals.failed.connect(self.on_task_failed)
+        worker.signals.cancelled.connect(self.on_task_cancelled)
+        self.task = worker
+        self.task_handler = on_finished
+        self.task_error_message = error_message
+        self.task_label.setText(label)
+        self.task_progress.setRange(0, 0)
+        self.set_task_visible(True)
+        QThreadPool.globalInstance().start(worker)
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task_label.setText('Отмена...')
+
+    def finish_task(self):
+        self.task = None
+        self.transfers.clear()
+        self.set_task_visible(False)
+        self.dump_profile()
+
+    def on_file_started(self, path, index, count):
+        self.task_label.setText(f'{path.rsplit("/", 1)[-1]} ({index}/{count})')
+
+    def on_transfer_progress(self, path, done, total):
+        # Файлы могут передаваться одновременно - показываем суммарный прогресс
+        self.transfers[path] = (done, total)
+        total_bytes = sum(size for _, size in self.transfers.values())
+        if total_bytes > 0:
+            done_bytes = sum(min(sent, size) for sent, size in self.transfers.values())
+            self.task_progress.setRange(0, 1000)
+            self.task_progress.setValue(int(done_bytes * 1000 / total_bytes))
+
+    def on_transfer_compressed(self, path, received, size):
+        self.statusBar().showMessage(
+            f'{path.rsplit("/", 1)[-1]}: получено {received // 1024} КБ вместо {size // 1024} КБ, '
+            f'сэкономлено {max(size - received, 0) // 1024} КБ', 15000)
+
+    def on_task_finished(self, result):
+        handler = self.task_handler
+        self.finish_task()
+        if handler is not None:
+            handler(result)
+
+    def on_task_failed(self, message):
+        self.finish_task()
+        QMessageBox.critical(self, 'Ошибка', f'{self.task_error_message}: {message}')
+
+    def on_task_cancelled(self):
+        self.finish_task()
+        self.currency_data.clear()
+
+    def on_tab_changed(self, index):
+        tab = self.tabs.widget(index)
+        if tab in self.tab_files and tab not in self.opened_tabs:
+            self.opened_tabs.add(tab)
+            for key in self.tab_files[tab]:
+                self.populate_file(key)
+
+    def on_file_fetched(self, key, raw):
+        if FILE_KINDS[key] == 'tail' and key in self.raw_files:
+            # Предыдущий кусок лога ещё не разобран: новый дописывается к нему, а не затирает
+            raw = merge_tail(self.raw_files[key], raw)
+        self.raw_files[key] = raw
+        self.file_runs[key] = TIMINGS.current
+        if self.file_tabs[key] in self.opened_tabs:
+            self.populate_file(key)
+
+    def populate_file(self, key):
+        # Разбор идёт в пуле потоков, в GUI возвращаются готовые данные для load_*. Разборы одного
+        # файла идут по очереди: следующий запускается из on_parse_done, иначе медленный разбор
+        # прежней загрузки мог бы показаться поверх более новой
+        if key not in self.raw_files or key in self.parse_tasks:
+            return
+        kind = FILE_KINDS[key]
+        archive = (self.chat_archive, self.chat_log_viewer.archive_server) if key == 'chat_log' else None
+        worker = Worker(parse_fetched, key, kind, self.raw_files.pop(key), self.chat_log_viewer.parse_lines, archive,
+                        self.file_runs.get(key))
+        worker.signals.result.connect(self.on_file_loaded)
+        worker.signals.failed.connect(self.on_parse_failed)
+        if archive is not None:
+            # Архив пополняется после выдачи записей, страницу архива обновляем по завершении
+            worker.signals.finished.connect(lambda _: self.chat_log_viewer.reload_archive())
+        worker.signals.finished.connect(lambda _, key=key: self.on_parse_done(key))
+        worker.signals.failed.connect(lambda _, key=key: self.on_parse_done(key))
+        self.parse_tasks[key] = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_parse_failed(self, message):
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка разбора файла: {message}')
+
+    def on_parse_done(self, key):
+        self.parse_tasks.pop(key, None)
+        if self.file_tabs[key] in self.opened_tabs:
+            self.populate_file(key)
+
+    def on_file_loaded(self, key, data):
+        with TIMINGS.span('populate', REMOTE_PATHS[key], self.file_runs.get(key)):
+            self.populate_editor(key, data)
+
+    def populate_editor(self, key, data):
+        # Передаём в редакторы уже разобранные данные, в потоке GUI остаётся только заполнение виджетов
+        if key == 'config':
+            self.config_editor.load_config(data)
+        elif key == 'merchants':
+            self.products_editor.load_merchants(data)
+        elif key in ('tokens', 'log'):
+            self.currency_data[key] = data
+            if len(self.currency_data) == 2:
+                self.currency_tracker.load_data(self.currency_data.pop('tokens'), self.currency_data.pop('log'))
+        elif key == 'announcements':
+            self.announcement_editor.load_announcements(data)
+        elif key == 'chat_log':
+            self.show_chat_log(*data)
+        elif key == 'bosses':
+            self.boss_editor.load_bosses(data)
+        elif key == 'raid_forge':
+            self.raid_editor.load_raid_forge(data)
+        elif key == 'raid_guard':
+            self.raid_editor.load_raid_guard(data)
+        if key in SAVED_FILES:
+            # Запоминаем исходное состояние редактора, чтобы при сохранении отправить только изменённое
+            self.loaded_hashes[key] = content_hash(self.serialize_file(key))
+
+    def show_chat_log(self, entries, replace):
+        if replace:
+            self.chat_log_viewer.load_entries(entries)
+        else:
+            self.chat_log_viewer.append_entries(entries)
 
     def load_configs(self):
-        try:
-            config_path = '/BepInEx/config/BloodyRewards.cfg'
-            merchants_path = '/BepInEx/config/BloodyMerchant/merchants.json'
-            tokens_path = '/BepInEx/config/BloodyWallet/tokens.json'
-            log_path = '/BepInEx/config/BloodyWallet/log.json'
-            announcements_path = '/BepInEx/config/KindredCommands/announcements.json'
-
-            # Загрузка BloodyRewards.cfg
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {config_path}', f.write)
-                self.config_editor.load_config(f.getvalue().decode('utf-8'))
-            
-            # Загрузка merchants.json
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {merchants_path}', f.write)
-                merchants = json.loads(f.getvalue().decode('utf-8'))
-                self.products_editor.load_merchants(merchants)
-
-            # Загрузка tokens.json и log.json
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {tokens_path}', f.write)
-                tokens_data = json.loads(f.getvalue().decode('utf-8'))
-                
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {log_path}', f.write)
-                log_data = json.loads(f.getvalue().decode('utf-8'))
-                
-            self.currency_tracker.load_data(tokens_data, log_data)
+        if not self.begin_operation('load_configs'):
+            return
+        # Добавляем загрузку лога чата (после подключения - всегда с начала файла)
+        self.chat_log_tail.reset()
+        self.currency_data.clear()
+        self.loaded_hashes.clear()
+        self.raw_files.clear()
+        self.start_task(fetch_remote_files, self.ftp_pool, REMOTE_FILES, self.chat_log_tail,
+                        self.file_cache, self.compressed_files(), error_message='Ошибка загрузки файлов')
 
-            # Загрузка announcements.json
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {announcements_path}', f.write)
-                announcements = json.loads(f.getvalue().decode('utf-8'))
-                self.announcement_editor.load_announcements(announcements)
-            
-            # Добавляем загрузку лога чата
-            self.load_chat_log()
-            
-            # Загрузка bosses.json
-            bosses_path = '/BepInEx/config/BloodyBoss/Bosses.json'
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {bosses_path}', f.write)
-                bosses = json.loads(f.getvalue().decode('utf-8'))
-                self.boss_editor.load_bosses(bosses)
-            
-            # Загрузка настроек рейдов
-            raid_forge_path = '/BepInEx/config/RaidForge.cfg'
-            raid_guard_path = '/BepInEx/config/io.zfolmt.RaidGuard.cfg'
-            
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {raid_forge_path}', f.write)
-                self.raid_editor.load_raid_forge(f.getvalue().decode('utf-8'))
-            
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {raid_guard_path}', f.write)
-                self.raid_editor.load_raid_guard(f.getvalue().decode('utf-8'))
-        
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка загрузки файлов: {str(e)}')
+    def compressed_files(self):
+        return COMPRESSED_FILES if self.ftp_connection.compression_input.isChecked() else set()
 
     def load_chat_log(self):
-        try:
-            log_path = '/BepInEx/LogOutput.log'
-            with BytesIO() as f:
-                self.ftp.retrbinary(f'RETR {log_path}', f.write)
-                log_text = f.getvalue().decode('utf-8', errors='ignore')
-                self.chat_log_viewer.load_log(log_text)
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка загрузки лога чата: {str(e)}')
+        if not self.chat_log_viewer.tail_mode.isChecked():
+            self.chat_log_tail.reset()
+        if self.ftp_pool is None:
+            QMessageBox.critical(self, 'Ошибка', 'Нет подключения к FTP.')
+            return
+        chat_log = [(key, path, kind) for key, path, kind in REMOTE_FILES if key == 'chat_log']
+        if not self.begin_operation('load_chat_log'):
+            return
+        self.start_task(fetch_remote_files, self.ftp_pool, chat_log, self.chat_log_tail, None,
+                        self.compressed_files(), error_message='Ошибка загрузки лога чата', label='LogOutput.log')
+
+    def serialize_file(self, key):
+        # Читаем редакторы в потоке GUI, в рабочий поток уходят готовые байты
+        if key == 'config':
+            text = self.config_editor.get_config()
+        elif key == 'merchants':
+            text = json.dumps(self.products_editor.get_merchants(), indent=2)
+        elif key == 'announcements':
+            text = json.dumps(self.announcement_editor.get_announcements(), indent=2)
+        elif key == 'bosses':
+            text = json.dumps(self.boss_editor.get_bosses(), indent=2)
+        elif key == 'raid_forge':
+            text = self.raid_editor.get_raid_forge_config()
+        elif key == 'raid_guard':
+            text = self.raid_editor.get_raid_guard_config()
+        return text.encode('utf-8')
 
     def save_all(self):
-        if not self.ftp:
-            QMessageBox.critical(self, 'Ошибка', 'FTP соединение потеряно. Пожалуйста, переподключитесь.')
+        if self.ftp_pool is None:
+            QMessageBox.critical(self, 'Ошибка', 'Нет подключения к FTP. Пожалуйста, подключитесь.')
+            return
+        if not self.begin_operation('save_all'):
             return
             
+        payloads = []
+        self.pending_save = {}
+        self.skipped_save = []
         try:
-            # Проверяем FTP соединение
-            try:
-                self.ftp.voidcmd("NOOP")
-            except:
-                # Если соединение разорвано, пытаемся переподключиться
-                self.ftp_connection.connect_ftp()
-                
-            config_path = '/BepInEx/config/BloodyRewards.cfg'
-            merchants_path = '/BepInEx/config/BloodyMerchant/merchants.json'
-            announcements_path = '/BepInEx/config/KindredCommands/announcements.json'
-
-            # Сохранение BloodyRewards.cfg
-            config_data = self.config_editor.get_config().encode('utf-8')
-            with BytesIO(config_data) as f:
-                self.ftp.storbinary(f'STOR {config_path}', f)
-            
-            # Сохранение merchants.json
-            merchants_data = json.dumps(self.products_editor.get_merchants(), indent=2).encode('utf-8')
-            with BytesIO(merchants_data) as f:
-                self.ftp.storbinary(f'STOR {merchants_path}', f)
-            
-            # Сохранение announcements.json
-            announcements_data = json.dumps(self.announcement_editor.get_announcements(), indent=2).encode('utf-8')
-            with BytesIO(announcements_data) as f:
-                self.ftp.storbinary(f'STOR {announcements_path}', f)
-            
-            # Сохранение bosses.json
-            bosses_path = '/BepInEx/config/BloodyBoss/Bosses.json'
-            bosses_data = json.dumps(self.boss_editor.get_bosses(), indent=2).encode('utf-8')
-            with BytesIO(bosses_data) as f:
-                self.ftp.storbinary(f'STOR {bosses_path}', f)
-            
-            # Сохранение настроек рейдов
-            raid_forge_path = '/BepInEx/config/RaidForge.cfg'
-            raid_guard_path = '/BepInEx/config/io.zfolmt.RaidGuard.cfg'
-            
-            raid_forge_data = self.raid_editor.get_raid_forge_config().encode('utf-8')
-            with BytesIO(raid_forge_data) as f:
-                self.ftp.storbinary(f'STOR {raid_forge_path}', f)
-            
-            raid_guard_data = self.raid_editor.get_raid_guard_config().encode('utf-8')
-            with BytesIO(raid_guard_data) as f:
-                self.ftp.storbinary(f'STOR {raid_guard_path}', f)
-            
-            QMessageBox.information(self, 'Успех', 'Все изменения сохранены!')
+            # Сериализация идёт в потоке GUI - в профиль операции она попадает отсюда
+            with self.profile.running() if self.profile is not None else nullcontext():
+                for key in SAVED_FILES:
+                    if key not in self.loaded_hashes:
+                        # Файл не загружен или его вкладку не открывали - на сервере остаётся исходная версия
+                        self.skipped_save.append(key)
+                        continue
+                    with TIMINGS.span('serialize', REMOTE_PATHS[key]) as timing:
+                        data = self.serialize_file(key)
+                        timing['bytes'] = len(data)
+                    digest = content_hash(data)
+                    if digest == self.loaded_hashes[key]:
+                        self.skipped_save.append(key)
+                        continue
+                    payloads.append((REMOTE_PATHS[key], data))
+                    self.pending_save[key] = digest
         except Exception as e:
+            self.dump_profile()
             QMessageBox.critical(self, 'Ошибка', f'Ошибка сохранения: {str(e)}')
+            return
+        if not payloads:
+            self.dump_profile()
+            QMessageBox.information(self, 'Сохранение', 'Изменений нет, файлы не отправлялись.')
+            return
+        self.start_task(store_remote_files, self.ftp_pool, payloads,
+                        on_finished=self.on_saved, error_message='Ошибка сохранения')
+
+    def on_saved(self, result):
+        self.loaded_hashes.update(self.pending_save)
+        written = ', '.join(REMOTE_PATHS[key].rsplit('/', 1)[-1] for key in self.pending_save)
+        skipped = ', '.join(REMOTE_PATHS[key].rsplit('/', 1)[-1] for key in self.skipped_save) or '-'
+        QMessageBox.information(self, 'Успех', f'Все изменения сохранены!\n\nЗаписаны: {written}\nБез изменений: {skipped}')
+
+def load_fleet(path):
+    """Серверы из servers.toml: таблицы [servers.<имя>] с host, port, user, password, connections, timeout."""
+    import tomllib
+    with open(path, 'rb') as f:
+        config = tomllib.load(f)
+    servers = []
+    for name, server in config.get('servers', {}).items():
+        if 'host' not in server:
+            raise ValueError(f'{path}: у сервера {name} не задан host')
+        params = (server['host'], int(server.get('port', 21)), server.get('user', ''), server.get('password', ''),
+                  int(server.get('timeout', FTP_TIMEOUT)))
+        servers.append((name, params, int(server.get('connections', 2))))
+    if not servers:
+        raise ValueError(f'{path}: не описано ни одного сервера ([servers.<имя>])')
+    return servers
+
+def fetch_fleet_files(pool, keys, savings=None):
+    # Тот же параллельный обход, что и при загрузке в окне, результаты собираются в словарь;
+    # в savings добавляется экономия байт на каждой сжатой передаче
+    worker = Worker(None)
+    files = {}
+    lock = threading.Lock()
+
+    def collect(key, data):
+        with lock:
+            files[key] = data
+
+    worker.signals.result.connect(collect, Qt.DirectConnection)
+    if savings is not None:
+        worker.signals.compressed.connect(lambda path, received, size: savings.append(size - received),
+                                          Qt.DirectConnection)
+    # Файлы нужны байтами целиком, поэтому все качаются как обычные: LogTail придержал бы
+    # недописанную последнюю строку лога чата, а лог транзакций разобрался бы в столбцы
+    fetch_remote_files(worker, pool, [(key, REMOTE_PATHS[key], 'text') for key in keys],
+                       None, compress=COMPRESSED_FILES)
+    return files
+
+def fleet_pull(name, pool, args):
+    savings = []
+    files = fetch_fleet_files(pool, args.keys, savings)
+    target = os.path.join(args.out, name)
+    os.makedirs(target, exist_ok=True)
+    for key, data in files.items():
+        with open(os.path.join(target, REMOTE_PATHS[key].rsplit('/', 1)[-1]), 'wb') as f:
+            f.write(data)
+    report = f'скачано {len(files)} файл(ов), {sum(map(len, files.values()))} байт -> {target}'
+    if savings:
+        report += f', сжатие сэкономило {sum(savings)} байт'
+    return report
+
+def fleet_push(name, pool, args):
+    # Как save_all: отправляются только файлы, отличающиеся от версии на сервере
+    current = {}
+    with pool.connection() as ftp:
+        for key in args.payloads:
+            try:
+                current[key] = content_hash(retrieve_file(ftp, REMOTE_PATHS[key]))
+            except ftplib.error_perm:
+                # Файла на сервере ещё нет
+                current[key] = None
+    payloads = [(REMOTE_PATHS[key], data) for key, data in args.payloads.items()
+                if current[key] != content_hash(data)]
+    if payloads:
+        store_remote_files(Worker(None), pool, payloads)
+    written = ', '.join(path.rsplit('/', 1)[-1] for path, _ in payloads) or '-'
+    return f'записаны: {written}; без изменений: {len(args.payloads) - len(payloads)}'
+
+def fleet_diff(name, pool, args):
+    import difflib
+    files = fetch_fleet_files(pool, args.keys)
+    changed = []
+    for key in args.keys:
+        reference, label = args.references[key]
+        if reference is None or content_hash(reference) == content_hash(files[key]):
+            continue
+        changed.append(REMOTE_PATHS[key].rsplit('/', 1)[-1])
+        diff = ''.join(difflib.unified_diff(
+            reference.decode('utf-8', errors='replace').splitlines(True),
+            files[key].decode('utf-8', errors='replace').splitlines(True),
+            fromfile=f'{label}:{REMOTE_PATHS[key]}', tofile=f'{name}:{REMOTE_PATHS[key]}'))
+        # Серверы сравниваются параллельно, вывод одного diff не должен перемешиваться с другим
+        with args.output_lock:
+            sys.stdout.write(diff)
+    return 'отличаются: ' + ', '.join(changed) if changed else 'совпадают'
+
+def parse_fleet_files(specs, command):
+    """KEY или KEY=ПУТЬ -> {ключ: локальные байты или None}; содержимое проверяется так же, как при загрузке."""
+    files = {}
+    for spec in specs:
+        key, _, path = spec.partition('=')
+        if key not in REMOTE_PATHS:
+            raise ValueError(f'неизвестный файл {key}, доступны: {", ".join(REMOTE_PATHS)}')
+        if command != 'pull' and FILE_KINDS[key] == 'tail':
+            raise ValueError(f'{key} нельзя отправлять или сравнивать')
+        if not path:
+            if command == 'push':
+                raise ValueError(f'для push укажите файл: {key}=ПУТЬ')
+            files[key] = None
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            parse_remote_file(data, FILE_KINDS[key])
+        except ValueError as e:
+            raise ValueError(f'{path}: {e}')
+        files[key] = data
+    return files
+
+def run_fleet(argv):
+    """python manager.py fleet pull|push|diff: одни и те же операции на нескольких серверах сразу."""
+    import argparse
+    parser = argparse.ArgumentParser(prog='manager.py fleet',
+                                     description='Операции с файлами сразу на нескольких серверах')
+    parser.add_argument('command', choices=['pull', 'push', 'diff'])
+    parser.add_argument('files', nargs='*', metavar='KEY[=ПУТЬ]',
+                        help='pull: ключи файлов (по умолчанию все); push: ключ=локальный файл; '
+                             'diff: ключ или ключ=локальный файл (без файла сравнение с первым сервером)')
+    parser.add_argument('--servers', default='servers.toml', help='описание серверов (TOML)')
+    parser.add_argument('--only', nargs='+', metavar='ИМЯ', help='только эти серверы')
+    parser.add_argument('--jobs', type=int, default=4, help='сколько серверов обрабатывать одновременно')
+    parser.add_argument('--out', default='fleet', help='pull: каталог для скачанных файлов')
+    args = parser.parse_args(argv)
+
+    try:
+        servers = load_fleet(args.servers)
+        if args.only:
+            servers = [server for server in servers if server[0] in args.only]
+        specs = args.files or (list(REMOTE_PATHS) if args.command == 'pull' else [])
+        if not specs:
+            parser.error('укажите файлы')
+        files = parse_fleet_files(specs, args.command)
+    except (OSError, ValueError) as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        return 2
+    args.keys = list(files)
+    args.payloads = files
+    args.references = {key: (data, 'local') for key, data in files.items()}
+    args.output_lock = threading.Lock()
+
+    def run(name, params, connections):
+        started = time.perf_counter()
+        pool = FTPPool(params, connections)
+        try:
+            return True, action(name, pool, args), time.perf_counter() - started
+        except TaskCancelled:
+            return False, 'отменено', time.perf_counter() - started
+        except Exception as e:
+            return False, f'{type(e).__name__}: {e}', time.perf_counter() - started
+        finally:
+            pool.close()
+
+    order = [name for name, _, _ in servers]
+    action = {'pull': fleet_pull, 'push': fleet_push, 'diff': fleet_diff}[args.command]
+    reports = {}
+    if args.command == 'diff' and None in files.values():
+        # Эталон для файлов без локальной копии - первый сервер списка
+        name, params, connections = servers[0]
+        pool = FTPPool(params, connections)
+        try:
+            remote = fetch_fleet_files(pool, [key for key, data in files.items() if data is None])
+            args.references.update((key, (data, name)) for key, data in remote.items())
+        except Exception as e:
+            print(f'Ошибка: не удалось загрузить эталон с {name}: {e}', file=sys.stderr)
+            return 2
+        finally:
+            pool.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(run, *server): server[0] for server in servers}
+        for future in as_completed(futures):
+            reports[futures[future]] = future.result()
+
+    width = max(map(len, reports), default=0)
+    for name in sorted(reports, key=order.index):
+        ok, message, elapsed = reports[name]
+        print(f'{name:<{width}}  {"OK" if ok else "ОШИБКА":<6}  {elapsed:6.2f} с  {message}')
+    failed = sum(not ok for ok, _, _ in reports.values())
+    print(f'Серверов: {len(reports)}, с ошибками: {failed}')
+    return 1 if failed else 0
+
+class StartupProfiler(QObject):
+    """Отчёт --profile-startup: импорты, создание виджетов и время до первой отрисовки окна."""
+    WIDGETS = [FTPConnectionWidget, ConfigEditor, ProductsEditor, CurrencyTracker, AnnouncementEditor,
+               ChatLogViewer, BossEditor, RaidEditor]
+
+    def __init__(self):
+        super().__init__()
+        self.spans = []
+        self.originals = []  # (класс, метод, исходная функция) - возвращаются после отчёта
+        self.imports_done = time.perf_counter()
+        self.instrument(MainWindow, 'initUI')
+        for widget in self.WIDGETS:
+            self.instrument(widget, '__init__')
+
+    def instrument(self, cls, method):
+        original = getattr(cls, method)
+        spans = self.spans
+        self.originals.append((cls, method, original))
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                spans.append((f'{cls.__name__}.{method}', time.perf_counter() - started))
+
+        setattr(cls, method, timed)
+
+    def watch(self, app):
+        # Первая отрисовка любого виджета окна
+        app.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            QApplication.instance().removeEventFilter(self)
+            self.report(time.perf_counter())
+        return False
+
+    def report(self, painted):
+        lines = ['Импорт модулей:']
+        for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f'  {name:<24}{seconds * 1000:9.1f} мс')
+        lines.append(f'  {"всего":<24}{(self.imports_done - STARTUP_BEGIN) * 1000:9.1f} мс')
+        lines.append('Создание виджетов:')
+        for name, seconds in self.spans:
+            lines.append(f'  {name:<32}{seconds * 1000:9.1f} мс')
+        lines.append(f'До первой отрисовки окна: {(painted - STARTUP_BEGIN) * 1000:.1f} мс')
+        print('\n'.join(lines), file=sys.stderr)
+        self.restore()
+
+    def restore(self):
+        # Дальше приложение работает без замеров: обычный импорт и исходные методы
+        import builtins
+        if _timed_import is not None and builtins.__import__ is _timed_import:
+            builtins.__import__ = _original_import
+        for cls, method, original in self.originals:
+            setattr(cls, method, original)
+        self.originals.clear()
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['fleet']:
+        # Без окна: QApplication не создаётся, сигналы рабочих функций вызываются напрямую
+        sys.exit(run_fleet(sys.argv[2:]))
+    profiler = None
+    if '--profile-startup' in sys.argv:
+        sys.argv.remove('--profile-startup')
+        profiler = StartupProfiler()
     app = QApplication(sys.argv)
     window = MainWindow()
+    if profiler is not None:
+        profiler.watch(app)
     window.show()
     sys.exit(app.exec_())